@@ -1,10 +1,30 @@
 from errors import *
 from tokens import *
 from collections import OrderedDict
+from itertools import accumulate, compress, repeat
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+import logging
+import mmap
+import os
+import re
+import sys
 
 # Language
 lang = 'en'
 
+# SymbolTable logs every define and lookup here at DEBUG level. Nothing
+# is shown unless the application asks for it, see show_symbol_log().
+symbol_log = logging.getLogger('LPI.symbols')
+
+
+def show_symbol_log():
+    """Prints symbol_log to stdout, as the interpreter's own entry points do"""
+
+    if not symbol_log.handlers:
+        symbol_log.addHandler(logging.StreamHandler(sys.stdout))
+        symbol_log.setLevel(logging.DEBUG)
+
 #########
 # Lexer #
 #########
@@ -16,6 +36,8 @@ class Symbol(object):
     def __init__(self, name, type=None):
         self.name = name
         self.type = type
+        # Set by SymbolTable.define
+        self.scope_level = None
 
 
 class BuiltInSymbol(Symbol):
@@ -30,37 +52,63 @@ class BuiltInSymbol(Symbol):
 
 
 class VarSymbol(Symbol):
-    def __init__(self, name, type):
+    def __init__(self, name, type, slot=None):
         super().__init__(name, type)
+        self.slot = slot
+
+    def __str__(self):
+        return f'name={self.name}, type={self.type}, slot={self.slot}'
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}({self.__str__()})>'
+
+
+class ProcedureSymbol(Symbol):
+    def __init__(self, name, scope, block=None):
+        super().__init__(name)
+        # SymbolTable of the procedure's block
+        self.scope = scope
+        self.block = block
 
     def __str__(self):
-        return f'name={self.name}, type={self.type}'
+        return f'name={self.name}, locals={len(self.scope.slots)}'
 
     def __repr__(self):
         return f'<{self.__class__.__name__}({self.__str__()})>'
 
 
 class SymbolTable(object):
-    def __init__(self):
+    def __init__(self, scope_name='global', scope_level=1, enclosing_scope=None):
         self._symbols = OrderedDict()
-        self.init_builtins()
+        self.scope_name = scope_name
+        self.scope_level = scope_level
+        self.enclosing_scope = enclosing_scope
+        # VarSymbols of this scope indexed by their slot
+        self.slots = []
+        if enclosing_scope is None:
+            self.init_builtins()
 
     def init_builtins(self):
         self.define(BuiltInSymbol(INTEGER))
         self.define(BuiltInSymbol(REAL))
 
     def __str__(self):
-        return f'Symbols: {[value for value in self._symbols.values()]}'
+        return (f'Scope {self.scope_name} (level {self.scope_level}) '
+                f'Symbols: {[value for value in self._symbols.values()]}')
 
     __repr__ = __str__
 
     def define(self, symbol):
-        print('Define: %s' % symbol)
+        symbol_log.debug('Define: %s', symbol)
+        symbol.scope_level = self.scope_level
         self._symbols[symbol.name] = symbol
 
-    def lookup(self, name):
-        print('Lookup: %s' % name)
-        return self._symbols.get(name)
+    def lookup(self, name, current_scope_only=False):
+        symbol_log.debug('Lookup: %s', name)
+        symbol = self._symbols.get(name)
+        if symbol is not None or current_scope_only or self.enclosing_scope is None:
+            return symbol
+        return self.enclosing_scope.lookup(name)
 
 
 class Lexer(object):
@@ -78,6 +126,9 @@ class Lexer(object):
             'real': Token(REAL, 'REAL'),
             'procedure': Token(PROCEDURE, 'PROCEDURE')
         }
+        # Operator tokens end up in the AST, so they are shared
+        self.OPERATOR_TOKENS = {char: Token(OPERATOR, char) for char in OPERATORS}
+        self.ASSIGN_TOKEN = Token(ASSIGN, ':=')
 
     def advance(self):
         self.pos += 1
@@ -146,7 +197,7 @@ class Lexer(object):
             if self.current_char in OPERATORS:
                 char = self.current_char
                 self.advance()
-                return Token(OPERATOR, char)
+                return self.OPERATOR_TOKENS[char]
 
             if self.current_char == '(':
                 self.advance()
@@ -162,7 +213,7 @@ class Lexer(object):
             if self.current_char == ':' and self.see_next_char() == '=':
                 self.advance()
                 self.advance()
-                return Token(ASSIGN, ':=')
+                return self.ASSIGN_TOKEN
 
             if self.current_char == ';':
                 self.advance()
@@ -184,87 +235,545 @@ class Lexer(object):
 
         return Token(EOF, None)
 
+
+# Whitespace and comments are skipped in front of every token, so a single
+# match produces exactly one token. Groups: 1 - REAL_CONST, 2 - INTEGER_CONST,
+# 3 - ID or keyword, 4 - punctuation, 5 - unclosed comment, 6 - end of text.
+TOKEN_PATTERN = re.compile(r'''
+    (?:\s+|\{[^}]*\})*
+    (?:
+        (\d+\.\d*)
+      | (\d+)
+      | ([^\W\d]\w*)
+      | (:=|[-+*/(),;.:])
+      | (\{)
+      | (\Z)
+    )?
+''', re.VERBOSE)
+
+# What FastLexer matches instead. Groups: 1 - whitespace and comments
+# skipped, 2 - the lexeme, which is looked up in a table. \S takes any
+# other character (an invalid one or an unclosed comment), so there is a
+# match at every position.
+SCAN_PATTERN = re.compile(r'''
+    ((?:\s+|\{[^}]*\})*)
+    (\d+(?:\.\d*)?|[^\W\d]\w*|:=|[-+*/(),;.:]|\Z|\S)
+''', re.VERBOSE)
+
+# What FastLexer.tokenize() splits the text on: the lexemes of
+# SCAN_PATTERN, with comments as lexemes too, so only whitespace is left
+# between them.
+SPLIT_PATTERN = re.compile(r'(\d+(?:\.\d*)?|[^\W\d]\w*|:=|[-+*/(),;.:]|\{[^}]*\}|\S)')
+
+
+class FastLexer(object):
+    """Drop-in replacement for Lexer built on SCAN_PATTERN.
+
+    get_next_token() does one regex match per token instead of one method
+    call per character. The token of every lexeme is kept in a table, so
+    a lexeme seen before costs one dict lookup: repeated identifiers and
+    numbers share one Token, like punctuation always did.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.match = TOKEN_PATTERN.match
+        self.RESERVED_KEYWORDS = {
+            'begin': Token(BEGIN, 'BEGIN'),
+            'end': Token(END, 'END'),
+            'div': Token(OPERATOR, 'DIV'),
+            'program': Token(PROGRAM, 'PROGRAM'),
+            'var': Token(VAR, 'VAR'),
+            'integer': Token(INTEGER, 'INTEGER'),
+            'real': Token(REAL, 'REAL'),
+            'procedure': Token(PROCEDURE, 'PROCEDURE')
+        }
+        self.PUNCTUATION = {
+            '+': Token(OPERATOR, '+'),
+            '-': Token(OPERATOR, '-'),
+            '*': Token(OPERATOR, '*'),
+            '/': Token(OPERATOR, '/'),
+            '(': Token(BRACKET_LEFT, '('),
+            ')': Token(BRACKET_RIGHT, ')'),
+            ':=': Token(ASSIGN, ':='),
+            ';': Token(SEMI, ';'),
+            '.': Token(DOT, '.'),
+            ',': Token(COMMA, ','),
+            ':': Token(COLON, ':')
+        }
+        self.EOF = Token(EOF, None)
+        self.scan = SCAN_PATTERN.match
+        # Token of every lexeme seen so far; '' is the end of the text
+        self.tokens = dict(self.PUNCTUATION)
+        self.tokens[''] = self.EOF
+
+    def token(self, lexeme):
+        """Token of a lexeme SCAN_PATTERN matched, added to self.tokens"""
+
+        char = lexeme[0]
+        if char.isdecimal():
+            if '.' in lexeme:
+                token = Token(REAL_CONST, float(lexeme))
+            else:
+                token = Token(INTEGER_CONST, int(lexeme))
+        elif char.isalnum() or char == '_':
+            name = lexeme.lower()
+            token = self.RESERVED_KEYWORDS.get(name) or Token(ID, name)
+        elif char == '{':
+            error(COMMENT_CLOSING[lang])
+        else:
+            error(INVALID_CHAR[lang])
+        self.tokens[lexeme] = token
+        return token
+
+    def get_next_token(self):
+        match = self.scan(self.text, self.pos)
+        lexeme = match[2]
+        token = self.tokens.get(lexeme)
+        if token is None:
+            token = self.token(lexeme)
+        self.pos = match.end()
+        return token
+
+    def tokenize(self):
+        """Lex the rest of the text at once into a TokenBuffer"""
+
+        # Every step runs in C over all tokens at once; only distinct
+        # lexemes are looked at one by one, in the order they first appear
+        # so the first bad one in the text is the one reported.
+        buffer = TokenBuffer(self.text)
+        parts = SPLIT_PATTERN.split(self.text[self.pos:])
+        lexemes = parts[1::2]
+        codes = {}
+        indexes = {}
+        comments = set()
+        for lexeme in dict.fromkeys(lexemes):
+            if lexeme[0] == '{' and lexeme[-1] == '}' and len(lexeme) > 1:
+                comments.add(lexeme)
+                continue
+            token = self.tokens.get(lexeme) or self.token(lexeme)
+            codes[lexeme] = TOKEN_CODES[token.type]
+            indexes[lexeme] = buffer.intern(token.type, token.value)
+        # Offsets of the starts and ends of the whitespace and lexemes in turn
+        offsets = list(accumulate(map(len, parts), initial=self.pos))
+        starts = offsets[1:-1:2]
+        ends = offsets[2::2]
+        if comments:
+            kept = [lexeme not in comments for lexeme in lexemes]
+            lexemes = list(compress(lexemes, kept))
+            starts = list(compress(starts, kept))
+            ends = list(compress(ends, kept))
+        buffer.types = array('B', list(map(codes.__getitem__, lexemes)))
+        buffer.values = array('I', list(map(indexes.__getitem__, lexemes)))
+        buffer.starts = array('I', starts)
+        buffer.ends = array('I', ends)
+        self.pos = len(self.text)
+        buffer.append(EOF, None, self.pos, self.pos)
+        return buffer
+
+
+class TokenBuffer(object):
+    """Token stream stored as parallel arrays (struct-of-arrays).
+
+    Token i has type TOKEN_TYPES[types[i]], spans text[starts[i]:ends[i]]
+    and has value constants[values[i]]. Values are interned per type, so
+    every token with the same type and value shares one pool entry.
+    Buffers lexed from a stream have no text, only the offsets. Offsets
+    are uint32 like values, 13 bytes per token in all, so a source is
+    limited to 4 GiB.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.types = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.values = array('I')
+        self.constants = []
+        self._constant_index = {}
+
+    def __len__(self):
+        return len(self.types)
+
+    def intern(self, _type, value):
+        """Index of value in the constant pool, adding it if needed"""
+
+        # Type is part of the key because 1 == 1.0 for dict lookups
+        key = (_type, value)
+        index = self._constant_index.get(key)
+        if index is None:
+            index = self._constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def append(self, _type, value, start, end):
+        self.types.append(TOKEN_CODES[_type])
+        self.starts.append(start)
+        self.ends.append(end)
+        self.values.append(self.intern(_type, value))
+
+    def type_at(self, i):
+        return TOKEN_TYPES[self.types[i]]
+
+    def value_at(self, i):
+        return self.constants[self.values[i]]
+
+    def lexeme_at(self, i):
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def cursor(self):
+        return TokenCursor(self)
+
+
+class TokenCursor(object):
+    """Feeds a TokenBuffer to Parser through the Lexer interface.
+
+    One Token object is built per constant pool entry and shared by every
+    occurrence, and peek() looks ahead without building tokens at all.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.pos = 0
+        self._tokens = [None] * len(buffer.constants)
+
+    def get_next_token(self):
+        buffer = self.buffer
+        pos = self.pos
+        if pos < len(buffer) - 1:
+            self.pos = pos + 1
+        index = buffer.values[pos]
+        token = self._tokens[index]
+        if token is None:
+            token = Token(TOKEN_TYPES[buffer.types[pos]], buffer.constants[index])
+            self._tokens[index] = token
+        return token
+
+    def peek(self, offset=0):
+        """Type of the token `offset` positions after the next one"""
+
+        pos = min(self.pos + offset, len(self.buffer) - 1)
+        return TOKEN_TYPES[self.buffer.types[pos]]
+
+
+def split_source(text, pieces):
+    """Offsets cutting text into at most `pieces` parts, each cut right after a ';'
+
+    A ';' inside a comment is never used, and nothing after an unclosed
+    '{' is cut off, so the part holding it still reports the comment.
+    """
+
+    bounds = [0]
+    # pos is always outside of comments
+    pos = 0
+    for i in range(1, pieces):
+        semi = text.find(';', max(pos, len(text) * i // pieces))
+        while semi != -1:
+            start = text.find('{', pos)
+            if start == -1 or start > semi:
+                break
+            end = text.find('}', start)
+            if end == -1:
+                semi = -1
+                break
+            pos = end + 1
+            if end > semi:
+                semi = text.find(';', pos)
+        if semi == -1:
+            break
+        pos = semi + 1
+        bounds.append(pos)
+    if bounds[-1] < len(text) or len(bounds) == 1:
+        bounds.append(len(text))
+    return bounds
+
+
+def _tokenize_piece(text):
+    buffer = FastLexer(text).tokenize()
+    # Constant pool keys (type, value) in index order
+    return buffer.types, buffer.starts, buffer.ends, buffer.values, list(buffer._constant_index)
+
+
+def parallel_tokenize(text, workers=None, min_piece_size=1 << 20):
+    """FastLexer(text).tokenize() with the pieces of text lexed in worker processes.
+
+    The source is cut by split_source() into pieces of at least
+    min_piece_size characters, one per worker. The pieces' buffers are
+    joined in order, so the result and the first error reported are the
+    same as lexing the whole text in one go.
+    """
+
+    workers = workers or os.cpu_count()
+    bounds = split_source(text, max(1, min(workers, len(text) // min_piece_size)))
+    if len(bounds) <= 2:
+        return FastLexer(text).tokenize()
+
+    buffer = TokenBuffer(text)
+    intern = buffer.intern
+    with ProcessPoolExecutor(workers) as executor:
+        results = executor.map(_tokenize_piece,
+                               [text[start:end] for start, end in zip(bounds, bounds[1:])])
+        for i, (types, starts, ends, values, constants) in enumerate(results):
+            if i < len(bounds) - 2:
+                # Every piece but the last ends with an EOF token
+                del types[-1], starts[-1], ends[-1], values[-1]
+            offset = bounds[i]
+            remap = [intern(_type, value) for _type, value in constants]
+            buffer.types.extend(types)
+            buffer.starts.extend(map(offset.__add__, starts))
+            buffer.ends.extend(map(offset.__add__, ends))
+            buffer.values.extend(map(remap.__getitem__, values))
+    return buffer
+
+
+# TOKEN_PATTERN for bytes sources; \w and \s match ASCII only there
+BYTES_TOKEN_PATTERN = re.compile(TOKEN_PATTERN.pattern.encode(), re.VERBOSE)
+NON_ASCII = re.compile(rb'[\x80-\xff]')
+
+CHUNK_SIZE = 1 << 16
+
+
+class ChunkedLexer(FastLexer):
+    """FastLexer reading the source from a file-like object in chunks.
+
+    reader.read(chunk_size) may return str or bytes (binary files, mmap),
+    bytes are lexed as they are and only lexemes are decoded, so they must
+    be ASCII outside comments: \w matches ASCII only in BYTES_TOKEN_PATTERN
+    and a non-ASCII identifier fails with NON_ASCII_BYTES. Just the
+    unconsumed tail of the text is kept: a match that runs into the end
+    of the chunk is retried once the next chunk is appended, and a
+    comment left open at the end of a chunk is skipped chunk by chunk.
+    """
+
+    def __init__(self, reader, chunk_size=CHUNK_SIZE):
+        super().__init__('')
+        self.reader = reader
+        self.chunk_size = chunk_size
+        # Offset in the source of self.text and of the last token returned
+        self.offset = 0
+        self.token_start = 0
+        self.text = reader.read(chunk_size)
+        self.at_end = not self.text
+        if isinstance(self.text, str):
+            self.match = TOKEN_PATTERN.match
+            self.decode = str
+            self.comment_end = '}'
+        else:
+            self.match = BYTES_TOKEN_PATTERN.match
+            self.decode = bytes.decode
+            self.comment_end = b'}'
+
+    def fill(self, keep_from):
+        """Drops text before keep_from and appends the next chunk"""
+
+        chunk = self.reader.read(self.chunk_size)
+        if not chunk:
+            self.at_end = True
+            return False
+        self.text = self.text[keep_from:] + chunk
+        self.pos -= keep_from
+        self.offset += keep_from
+        return True
+
+    def skip_comment(self):
+        """Skips the rest of a comment that is still open at the end of the text"""
+
+        while self.fill(len(self.text)):
+            end = self.text.find(self.comment_end)
+            if end != -1:
+                self.pos = end + 1
+                return
+        error(COMMENT_CLOSING[lang])
+
+    def get_next_token(self):
+        while True:
+            match = self.match(self.text, self.pos)
+            kind = match.lastindex
+            if self.at_end:
+                break
+            if kind == 5:
+                self.skip_comment()
+            elif match.end() == len(self.text):
+                self.fill(match.start(kind) if kind else match.end())
+            else:
+                break
+
+        if kind is None:
+            if self.decode is bytes.decode and self.text[match.end()] >= 0x80:
+                error(NON_ASCII_BYTES[lang])
+            error(INVALID_CHAR[lang])
+        self.pos = match.end()
+        self.token_start = self.offset + match.start(kind)
+
+        if kind == 4:
+            return self.PUNCTUATION[self.decode(match.group(4))]
+        if kind == 3:
+            name = self.decode(match.group(3)).lower()
+            return self.RESERVED_KEYWORDS.get(name) or Token(ID, name)
+        if kind == 2:
+            return Token(INTEGER_CONST, int(match.group(2)))
+        if kind == 1:
+            return Token(REAL_CONST, float(match.group(1)))
+        if kind == 5:
+            error(COMMENT_CLOSING[lang])
+        return self.EOF
+
+    def tokenize(self):
+        """Lex the rest of the source into a TokenBuffer, chunk by chunk.
+
+        Offsets count from the start of the source, in characters for str
+        and in bytes for bytes. The buffer keeps no text.
+        """
+
+        buffer = TokenBuffer(None)
+        while True:
+            token = self.get_next_token()
+            buffer.append(token.type, token.value, self.token_start, self.offset + self.pos)
+            if token.type == EOF:
+                return buffer
+
 ##########
 # Parser #
 ##########
 
 
 class AST(object):
-    pass
+    # Nodes are slotted: no per-instance __dict__. Besides their own fields
+    # they reserve slots for what the analysis passes attach (symbol,
+    # depth, index, type, promote). Tokens aren't kept when the value
+    # alone is enough; the token properties rebuild them on demand.
+    __slots__ = ()
 
 
 class BinOp(AST):
+    __slots__ = ('left', 'op', 'right', 'type')
+
     def __init__(self, left, op, right):
         self.left = left
-        self.token = self.op = op
+        self.op = op
         self.right = right
 
+    @property
+    def token(self):
+        return self.op
+
 
 class UnOp(AST):
+    __slots__ = ('op', 'expr', 'type')
+
     def __init__(self, op, expr):
-        self.token = self.op = op
+        self.op = op
         self.expr = expr
 
+    @property
+    def token(self):
+        return self.op
+
 
 class Num(AST):
+    __slots__ = ('value', 'type')
+
     def __init__(self, token):
-        self.token = token
         self.value = token.value
 
+    @property
+    def token(self):
+        return Token(INTEGER_CONST if isinstance(self.value, int) else REAL_CONST, self.value)
+
 
 class Compound(AST):
+    __slots__ = ('children',)
+
     def __init__(self):
         self.children = []
 
 
 class AssignOp(AST):
+    __slots__ = ('left', 'op', 'right', 'promote')
+
     def __init__(self, left, op, right):
         self.left = left
-        self.token = self.op = op
+        self.op = op
         self.right = right
 
+    @property
+    def token(self):
+        return self.op
+
 
 class Var(AST):
+    __slots__ = ('value', 'depth', 'index', 'type')
+
     def __init__(self, token):
-        self.token = token
         self.value = token.value
 
+    @property
+    def token(self):
+        return Token(ID, self.value)
+
 
 class NoOp(AST):
-    pass
+    __slots__ = ()
 
 
 class Program(AST):
+    __slots__ = ('name', 'block')
+
     def __init__(self, name, block):
         self.name = name
         self.block = block
 
 
 class Block(AST):
+    __slots__ = ('declarations', 'compound_statement')
+
     def __init__(self, var_decl, compound_statement):
         self.declarations = var_decl
         self.compound_statement = compound_statement
 
 
 class ProcedureDecl(AST):
+    __slots__ = ('name', 'block', 'symbol')
+
     def __init__(self, name, block):
         self.name = name
         self.block = block
 
 
+class ProcedureCall(AST):
+    __slots__ = ('name', 'symbol', 'depth')
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def token(self):
+        return Token(ID, self.name)
+
+
 class VarDecl(AST):
+    __slots__ = ('var_node', 'type_node')
+
     def __init__(self, var_node, type_node):
         self.var_node = var_node
         self.type_node = type_node
 
 
 class Type(AST):
+    __slots__ = ('value',)
+
     def __init__(self, token):
-        self.token = token
         self.value = token.value
 
+    @property
+    def token(self):
+        return Token(self.value, self.value)
+
 
 class Token(object):
+    __slots__ = ('type', 'value')
+
     def __init__(self, _type, value):
         self.type = _type
         self.value = value
@@ -280,6 +789,17 @@ class Parser(object):
     def __init__(self, lexer):
         self.lexer = lexer
         self.current_token = self.lexer.get_next_token()
+        self.constants = {}
+
+    def number(self, token):
+        """Num node for a constant token; equal constants share one node"""
+
+        # Type is part of the key because 1 == 1.0 for dict lookups
+        key = (token.type, token.value)
+        node = self.constants.get(key)
+        if node is None:
+            node = self.constants[key] = Num(token)
+        return node
 
     def factor(self):
         """factor: (plus|minus) factor
@@ -302,11 +822,11 @@ class Parser(object):
 
         elif token.type == INTEGER_CONST:
             self.eat(INTEGER_CONST)
-            return Num(token)
+            return self.number(token)
 
         elif token.type == REAL_CONST:
             self.eat(REAL_CONST)
-            return Num(token)
+            return self.number(token)
 
         else:
             return self.variable()
@@ -363,24 +883,39 @@ class Parser(object):
     def empty(self):
         return NoOp()
 
-    def assignment_statement(self):
+    def assignment_statement(self, left=None):
         """assignment_statement: variable ASSIGN expr"""
-        left = self.variable()
+        if left is None:
+            left = self.variable()
         token = self.current_token
         self.eat(ASSIGN)
         right = self.expr()
         return AssignOp(left=left, op=token, right=right)
 
+    def proccall_statement(self, name):
+        """proccall_statement: ID (BRACKET_LEFT BRACKET_RIGHT)?"""
+        if self.current_token.type == BRACKET_LEFT:
+            self.eat(BRACKET_LEFT)
+            self.eat(BRACKET_RIGHT)
+        return ProcedureCall(name)
+
     def statement(self):
         """statement: compound_statement
                     | assignment_statement
+                    | proccall_statement
                     | empty
         """
 
         if self.current_token.type == BEGIN:
             node = self.compound_statement()
         elif self.current_token.type == ID:
-            node = self.assignment_statement()
+            # The ID is eaten first: only the token after it tells
+            # an assignment from a procedure call
+            left = self.variable()
+            if self.current_token.type == ASSIGN:
+                node = self.assignment_statement(left)
+            else:
+                node = self.proccall_statement(left.value)
         else:
             node = self.empty()
 
@@ -484,10 +1019,13 @@ class Parser(object):
 
            statement: compound_statement
                     | assignment_statement
+                    | proccall_statement
                     | empty
 
            assignment_statement: variable ASSIGN expr
 
+           proccall_statement: ID (BRACKET_LEFT BRACKET_RIGHT)?
+
            variable: ID
 
            empty:
@@ -518,6 +1056,87 @@ class Parser(object):
             error(INVALID_SYNTAX[lang])
         return node
 
+
+class PrattParser(Parser):
+    """Parser whose expr() is table-driven precedence climbing.
+
+    Operands and pending operators live on explicit stacks, so parse time
+    doesn't depend on how deeply brackets or unary signs are nested, and
+    Python's recursion limit is never hit. Produces the same nodes as
+    Parser.expr(); a new binary operator only needs a BINARY_PRECEDENCE
+    entry (all of them are left-associative).
+    """
+
+    BINARY_PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, 'DIV': 2}
+    UNARY_OPERATORS = ('+', '-')
+
+    # Kinds of entries on the operator stack
+    BINARY, UNARY, BRACKET = range(3)
+
+    def reduce(self, operands, operators, precedence):
+        """Build BinOps from stacked operators binding at least as tight as precedence"""
+
+        while operators and operators[-1][0] == self.BINARY and operators[-1][1] >= precedence:
+            token = operators.pop()[2]
+            right = operands.pop()
+            operands[-1] = BinOp(left=operands[-1], op=token, right=right)
+
+    @staticmethod
+    def apply_unary(operand, operators):
+        while operators and operators[-1][0] == PrattParser.UNARY:
+            operand = UnOp(operators.pop()[2], operand)
+        return operand
+
+    def expr(self):
+        operands = []
+        operators = []
+        brackets = 0
+
+        while True:
+            # Operand position: prefix signs and opening brackets
+            token = self.current_token
+            if token.type == BRACKET_LEFT:
+                self.eat(BRACKET_LEFT)
+                operators.append((self.BRACKET, 0, token))
+                brackets += 1
+                continue
+            if token.value in self.UNARY_OPERATORS:
+                self.eat(OPERATOR)
+                operators.append((self.UNARY, 0, token))
+                continue
+            if token.type == INTEGER_CONST:
+                self.eat(INTEGER_CONST)
+                operand = self.number(token)
+            elif token.type == REAL_CONST:
+                self.eat(REAL_CONST)
+                operand = self.number(token)
+            else:
+                operand = self.variable()
+            operands.append(self.apply_unary(operand, operators))
+
+            # Operator position: closing brackets, then a binary operator or the end
+            while True:
+                token = self.current_token
+                precedence = self.BINARY_PRECEDENCE.get(token.value)
+                if precedence is not None:
+                    self.reduce(operands, operators, precedence)
+                    self.eat(OPERATOR)
+                    operators.append((self.BINARY, precedence, token))
+                    break
+
+                if token.type == INTEGER_CONST:
+                    error(INVALID_SYNTAX[lang])
+
+                if not brackets:
+                    self.reduce(operands, operators, 0)
+                    return operands.pop()
+
+                self.eat(BRACKET_RIGHT)
+                self.reduce(operands, operators, 0)
+                operators.pop()
+                brackets -= 1
+                operands.append(self.apply_unary(operands.pop(), operators))
+
 ###############
 # Interpreter #
 ###############
@@ -533,43 +1152,171 @@ class NodeVisitor(object):
         raise Exception(f'visit_{type(node).__name__} is not defined')
 
 
-class Interpreter(NodeVisitor):
+class IterativeNodeVisitor(object):
+    """Explicit-stack alternative to NodeVisitor.
+
+    For every node the traversal calls, if defined:
+        enter_<Node>(node)                  - pre-order, before the children
+        children_<Node>(node)               - the children to visit, in order
+        leave_<Node>(node, *child_results)  - post-order, its result goes to the parent
+    leave_<Node> is required; enter_<Node> is optional and children_<Node>
+    defaults to the node's structural children (see below). Visitors change
+    what gets visited by overriding children_<Node>.
+
+    visit() runs on an explicit stack, so tree depth is bounded by memory
+    rather than the C stack. visit_recursive() runs the same hooks with
+    Python recursion and is kept as a reference for benchmarks.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+
+    def handlers(self, node_class):
+        handlers = self._handlers.get(node_class)
+        if handlers is None:
+            name = node_class.__name__
+            leave = getattr(self, 'leave_' + name, None)
+            if leave is None:
+                raise Exception(f'leave_{name} is not defined')
+            handlers = self._handlers[node_class] = (
+                getattr(self, 'enter_' + name, None),
+                getattr(self, 'children_' + name, None),
+                leave
+            )
+        return handlers
+
+    def visit(self, tree):
+        try:
+            next(self.steps(tree, 0))
+        except StopIteration as stop:
+            return stop.value
+
+    def steps(self, tree, budget):
+        """The traversal behind visit(), pausing after every budget stack entries.
+
+        Every next() runs the traversal on for up to budget entries, so a
+        caller can interleave it with other work; a budget of 0 never
+        pauses. The result of the visit is the value of the StopIteration
+        that ends it.
+        """
+
+        cache = self._handlers
+        results = []
+        push_result = results.append
+        pop_result = results.pop
+        # Entries are nodes to enter or (node, leave, children count) to leave
+        stack = [tree]
+        push = stack.append
+        pop = stack.pop
+
+        while True:
+            for _ in repeat(None, budget) if budget > 0 else repeat(None):
+                if not stack:
+                    return pop_result()
+                entry = pop()
+                if type(entry) is tuple:
+                    node, leave, count = entry
+                    if count == 1:
+                        results[-1] = leave(node, results[-1])
+                    elif count == 2:
+                        right = pop_result()
+                        results[-1] = leave(node, results[-1], right)
+                    else:
+                        args = results[-count:]
+                        del results[-count:]
+                        push_result(leave(node, *args))
+                    continue
+
+                handlers = cache.get(type(entry))
+                if handlers is None:
+                    handlers = self.handlers(type(entry))
+                enter, children, leave = handlers
+                if enter is not None:
+                    enter(entry)
+                nodes = children(entry) if children is not None else None
+                if nodes:
+                    push((entry, leave, len(nodes)))
+                    stack.extend(reversed(nodes))
+                else:
+                    push_result(leave(entry))
+            if not stack:
+                return pop_result()
+            yield
+
+    def visit_recursive(self, node):
+        enter, children, leave = self.handlers(type(node))
+        if enter is not None:
+            enter(node)
+        if children is None:
+            return leave(node)
+        return leave(node, *[self.visit_recursive(n) for n in children(node)])
+
+    def children_BinOp(self, node):
+        return node.left, node.right
+
+    def children_UnOp(self, node):
+        return node.expr,
+
+    def children_Compound(self, node):
+        return node.children
+
+    def children_AssignOp(self, node):
+        return node.left, node.right
+
+    def children_Program(self, node):
+        return node.block,
+
+    def children_Block(self, node):
+        return [*node.declarations, node.compound_statement]
+
+    def children_ProcedureDecl(self, node):
+        return node.block,
+
+    def children_VarDecl(self, node):
+        return node.var_node, node.type_node
+
+
+class Interpreter(IterativeNodeVisitor):
     def __init__(self, parser):
+        super().__init__()
         self.parser = parser
         self.GLOBAL_SCOPE = {}
 
-    def visit_BinOp(self, node):
+    def leave_BinOp(self, node, left, right):
         match node.op.value:
             case '+':
-                return self.visit(node.left) + self.visit(node.right)
+                return left + right
             case '-':
-                return self.visit(node.left) - self.visit(node.right)
+                return left - right
             case '*':
-                return self.visit(node.left) * self.visit(node.right)
+                return left * right
             case '/':
-                return self.visit(node.left) / self.visit(node.right)
+                return left / right
             case 'DIV':
-                return self.visit(node.left) // self.visit(node.right)
+                return left // right
 
-    def visit_Num(self, node):
+    def leave_Num(self, node):
         return node.value
 
-    def visit_UnOp(self, node):
+    def leave_UnOp(self, node, value):
         if node.op.value == '+':
-            return +self.visit(node.expr)
+            return +value
         elif node.op.value == '-':
-            return -self.visit(node.expr)
+            return -value
+
+    def leave_Compound(self, node, *results):
+        return None
 
-    def visit_Compound(self, node):
-        for n in node.children:
-            self.visit(n)
+    def children_AssignOp(self, node):
+        return node.right,
 
-    def visit_AssignOp(self, node):
+    def leave_AssignOp(self, node, value):
+        if getattr(node, 'promote', False):
+            value = float(value)
         var = node.left.value
-        value = self.visit(node.right)
         self.GLOBAL_SCOPE[var] = value
 
-    def visit_Var(self, node):
+    def leave_Var(self, node):
         name = node.value
         value = self.GLOBAL_SCOPE.get(name, None)
         if value is None:
@@ -577,24 +1324,35 @@ class Interpreter(NodeVisitor):
         else:
             return value
 
-    def visit_Program(self, node):
-        self.visit(node.block)
+    def leave_Program(self, node, block):
+        return None
+
+    def leave_Block(self, node, *results):
+        return None
+
+    def children_ProcedureDecl(self, node):
+        return ()
+
+    def leave_ProcedureDecl(self, node):
+        return None
+
+    def children_ProcedureCall(self, node):
+        return ()
 
-    def visit_Block(self, node):
-        for decl_node in node.declarations:
-            self.visit(decl_node)
-        self.visit(node.compound_statement)
+    def leave_ProcedureCall(self, node):
+        # Procedures need the activation records of SlotInterpreter
+        error(UNSUPPORTED_PROCEDURE_CALL[lang])
 
-    def visit_ProcedureDecl(self, node):
-        pass
+    def children_VarDecl(self, node):
+        return ()
 
-    def visit_VarDecl(self, node):
+    def leave_VarDecl(self, node):
         return None
 
-    def visit_Type(self, node):
+    def leave_Type(self, node):
         return None
 
-    def visit_NoOp(self, node):
+    def leave_NoOp(self, node):
         return None
 
     def interpret(self):
@@ -602,65 +1360,396 @@ class Interpreter(NodeVisitor):
         return self.visit(tree)
 
 
-class SymbolTableBuilder(NodeVisitor):
+class Unassigned(object):
+    def __repr__(self):
+        return 'UNASSIGNED'
+
+
+UNASSIGNED = Unassigned()
+
+
+class ActivationRecord(object):
+    def __init__(self, size, parent=None):
+        self.slots = [UNASSIGNED] * size
+        # Record of the lexically enclosing scope
+        self.parent = parent
+
+
+class RecordPool(object):
+    """Free activation records of one procedure, reused between calls"""
+
+    def __init__(self, size):
+        self.size = size
+        self.empty_slots = (UNASSIGNED,) * size
+        self.free = []
+
+    def acquire(self, parent):
+        if not self.free:
+            return ActivationRecord(self.size, parent)
+        record = self.free.pop()
+        record.parent = parent
+        return record
+
+    def release(self, record):
+        # Same-size slice assignment overwrites the list in place
+        record.slots[:] = self.empty_slots
+        record.parent = None
+        self.free.append(record)
+
+
+class SlotInterpreter(Interpreter):
+    """Interpreter that keeps variables in lists indexed by slot.
+
+    The tree must have gone through SymbolTableBuilder with symbol_table,
+    which annotates every Var with its (depth, index) address: the number
+    of scopes to go out and the slot in that scope. Names are only looked
+    up when GLOBAL_SCOPE is requested.
+
+    A procedure call visits the procedure's block as the child of the
+    ProcedureCall node, in an activation record from the procedure's
+    RecordPool. Calls nested deeper than max_call_depth fail with
+    CALL_DEPTH_EXCEEDED.
+    """
+
+    def __init__(self, symbol_table, max_call_depth=100):
+        IterativeNodeVisitor.__init__(self)
+        self.parser = None
+        self.names = [symbol.name for symbol in symbol_table.slots]
+        self.global_record = ActivationRecord(len(self.names))
+        self.record = self.global_record
+        self.max_call_depth = max_call_depth
+        self.call_depth = 0
+        self.pools = {}
+        # (pool, caller's record) of every running call
+        self.calls = []
+
+    @property
+    def GLOBAL_SCOPE(self):
+        return {name: value for name, value in zip(self.names, self.global_record.slots)
+                if value is not UNASSIGNED}
+
+    def record_at(self, depth):
+        record = self.record
+        for _ in range(depth):
+            record = record.parent
+        return record
+
+    def leave_AssignOp(self, node, value):
+        if getattr(node, 'promote', False):
+            value = float(value)
+        var = node.left
+        if var.depth:
+            self.record_at(var.depth).slots[var.index] = value
+        else:
+            self.record.slots[var.index] = value
+
+    def leave_Var(self, node):
+        if node.depth:
+            value = self.record_at(node.depth).slots[node.index]
+        else:
+            value = self.record.slots[node.index]
+        if value is UNASSIGNED:
+            raise NameError(repr(node.value))
+        return value
+
+    def enter_ProcedureCall(self, node):
+        if self.call_depth >= self.max_call_depth:
+            error(CALL_DEPTH_EXCEEDED[lang])
+        symbol = node.symbol
+        pool = self.pools.get(symbol)
+        if pool is None:
+            pool = self.pools[symbol] = RecordPool(len(symbol.scope.slots))
+
+        self.calls.append((pool, self.record))
+        self.record = pool.acquire(self.record_at(node.depth))
+        self.call_depth += 1
+
+    def children_ProcedureCall(self, node):
+        return node.symbol.block,
+
+    def leave_ProcedureCall(self, node, block):
+        pool, caller = self.calls.pop()
+        pool.release(self.record)
+        self.record = caller
+        self.call_depth -= 1
+
+    def steps(self, tree, budget):
+        try:
+            return (yield from super().steps(tree, budget))
+        finally:
+            # Unwind calls left running by an error or by closing the generator early
+            while self.calls:
+                self.leave_ProcedureCall(None, None)
+
+
+class SymbolTableBuilder(IterativeNodeVisitor):
     def __init__(self):
+        super().__init__()
         self.symbol_table = SymbolTable()
+        self.current_scope = self.symbol_table
 
-    def visit_BinOp(self, node):
-        self.visit(node.left)
-        self.visit(node.right)
+    def resolve(self, node):
+        """Annotate a Var with its declared type and (depth, index) address"""
 
-    def visit_Num(self, node):
-        pass
+        symbol = self.current_scope.lookup(node.value)
+        if not isinstance(symbol, VarSymbol):
+            raise NameError(repr(node.value))
+        node.type = symbol.type.name
+        node.depth = self.current_scope.scope_level - symbol.scope_level
+        node.index = symbol.slot
 
-    def visit_UnOp(self, node):
-        self.visit(node.expr)
+    def leave_BinOp(self, node, left, right):
+        return None
 
-    def visit_Compound(self, node):
-        for n in node.children:
-            self.visit(n)
+    def leave_Num(self, node):
+        return None
 
-    def visit_AssignOp(self, node):
-        var_name = node.left.value
-        if self.symbol_table.lookup(var_name) is None:
-            raise NameError(repr(var_name))
-        self.visit(node.right)
+    def leave_UnOp(self, node, expr):
+        return None
 
-    def visit_Var(self, node):
-        var_name = node.value
-        if self.symbol_table.lookup(var_name) is None:
-            raise NameError(repr(var_name))
+    def leave_Compound(self, node, *results):
+        return None
 
-    def visit_Program(self, node):
-        self.visit(node.block)
+    def leave_AssignOp(self, node, left, right):
+        return None
+
+    def leave_Var(self, node):
+        self.resolve(node)
 
-    def visit_Block(self, node):
-        for decl_node in node.declarations:
-            self.visit(decl_node)
-        self.visit(node.compound_statement)
+    def leave_Program(self, node, block):
+        return None
 
-    def visit_ProcedureDecl(self, node):
-        pass
+    def leave_Block(self, node, *results):
+        return None
 
-    def visit_VarDecl(self, node):
+    def enter_ProcedureDecl(self, node):
+        name = node.name
+        if self.current_scope.lookup(name, current_scope_only=True) is not None:
+            error(DUPLICATE_DECLARATION[lang])
+        scope = SymbolTable(name, self.current_scope.scope_level + 1, self.current_scope)
+        symbol = ProcedureSymbol(name, scope, node.block)
+        self.current_scope.define(symbol)
+        node.symbol = symbol
+        self.current_scope = scope
+
+    def leave_ProcedureDecl(self, node, block):
+        self.current_scope = self.current_scope.enclosing_scope
+
+    def leave_ProcedureCall(self, node):
+        symbol = self.current_scope.lookup(node.name)
+        if not isinstance(symbol, ProcedureSymbol):
+            raise NameError(repr(node.name))
+        node.symbol = symbol
+        # Scopes to go out to reach the one the procedure is declared in
+        node.depth = self.current_scope.scope_level - symbol.scope_level
+
+    def children_VarDecl(self, node):
+        return ()
+
+    def leave_VarDecl(self, node):
         name = node.var_node.value
-        type = self.symbol_table.lookup(node.type_node.value)
-        if self.symbol_table.lookup(name) is not None:
+        type = self.current_scope.lookup(node.type_node.value)
+        if self.current_scope.lookup(name, current_scope_only=True) is not None:
             error(DUPLICATE_DECLARATION[lang])
-        self.symbol_table.define(VarSymbol(name, type))
+        symbol = VarSymbol(name, type, slot=len(self.current_scope.slots))
+        self.current_scope.define(symbol)
+        self.current_scope.slots.append(symbol)
+        node.var_node.depth = 0
+        node.var_node.index = symbol.slot
 
-    def visit_Type(self, node):
+    def leave_Type(self, node):
         return None
 
-    def visit_NoOp(self, node):
+    def leave_NoOp(self, node):
         return None
 
 
+#####################
+# Compiled programs #
+#####################
+
+
+def analyze_tree(tree, optimize=False, check_types=True, symbol_table=None):
+    """(tree, symbol table) ready to execute: optimized if asked, resolved and type checked.
+
+    Types are checked on the tree as written, before constant folding can
+    hide an error, so optimizing never changes which programs are accepted.
+    The optimizer rebuilds the nodes it changes, so the optimized tree is
+    then resolved and checked again and every ProcedureSymbol.block is the
+    block that runs. symbol_table, if given, must be the result of
+    resolving tree.
+    """
+
+    # Imported here since optimizer and typechecker import this module
+    import optimizer
+    import typechecker
+    if symbol_table is None:
+        symtab = SymbolTableBuilder()
+        symtab.visit(tree)
+        symbol_table = symtab.symbol_table
+    if check_types:
+        typechecker.check_types(tree)
+    if optimize:
+        tree, _ = optimizer.optimize(tree)
+        symtab = SymbolTableBuilder()
+        symtab.visit(tree)
+        symbol_table = symtab.symbol_table
+        if check_types:
+            typechecker.check_types(tree)
+    return tree, symbol_table
+
+
+class CompiledProgram(object):
+    """A parsed, analyzed and type checked program, ready to run.
+
+    It can't be changed after __init__, and running it only reads the tree
+    and the symbol table, so any number of threads can execute one
+    CompiledProgram at the same time without locks. Everything a run
+    writes lives in its own ExecutionState.
+    """
+
+    __slots__ = ('tree', 'symbol_table', 'names')
+
+    def __init__(self, tree, symbol_table):
+        object.__setattr__(self, 'tree', tree)
+        object.__setattr__(self, 'symbol_table', symbol_table)
+        object.__setattr__(self, 'names', tuple(symbol.name for symbol in symbol_table.slots))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    @classmethod
+    def from_source(cls, text, optimize=False, lexer_class=FastLexer, parser_class=Parser):
+        tree = parser_class(lexer_class(text)).parse()
+        return cls(*analyze_tree(tree, optimize))
+
+    def execute(self, max_call_depth=100):
+        """Runs the program in a new ExecutionState and returns its GLOBAL_SCOPE"""
+
+        return ExecutionState(self, max_call_depth).run()
+
+
+class ExecutionState(SlotInterpreter):
+    """What one run of a CompiledProgram writes: activation records and call state"""
+
+    def __init__(self, program, max_call_depth=100):
+        super().__init__(program.symbol_table, max_call_depth)
+        self.program = program
+
+    def run(self):
+        self.visit(self.program.tree)
+        return self.GLOBAL_SCOPE
+
+
 def error(e):
     raise Exception(e)
 
 
-def main():
+def execute(tree, engine='tree', symbol_table=None):
+    """Run a parsed program with the chosen engine and return its GLOBAL_SCOPE
+
+    engine: 'tree'    - Interpreter walking the AST
+            'slots'   - SlotInterpreter, needs the tree analyzed with symbol_table
+            'vm'      - bytecode Compiler + VirtualMachine
+            'closure' - ClosureCompiler
+            'python'  - PythonTranslator compiled by CPython
+    Only 'slots' runs procedure calls, the others reject them with
+    UNSUPPORTED_PROCEDURE_CALL.
+    """
+
+    if engine == 'tree':
+        interpreter = Interpreter(None)
+        interpreter.visit(tree)
+        return interpreter.GLOBAL_SCOPE
+    if engine == 'slots':
+        if symbol_table is None:
+            symtab = SymbolTableBuilder()
+            symtab.visit(tree)
+            symbol_table = symtab.symbol_table
+        interpreter = SlotInterpreter(symbol_table)
+        interpreter.visit(tree)
+        return interpreter.GLOBAL_SCOPE
+    if engine == 'vm':
+        # Imported here since compiler imports this module
+        from compiler import compile_program
+        from vm import VirtualMachine
+        return VirtualMachine(compile_program(tree)).run()
+    if engine == 'closure':
+        from closures import compile_program
+        return compile_program(tree)()
+    if engine == 'python':
+        from translators import PythonTranslator
+        translator = PythonTranslator(None)
+        translator.translate(tree)
+        return translator.execute()
+    error(UNKNOWN_ENGINE[lang])
+
+
+def parse_file(path, parser_class=Parser, chunk_size=CHUNK_SIZE, use_mmap=False):
+    """Parses the program in the file at path without reading it into one string.
+
+    The file is read as UTF-8 text. With use_mmap it is lexed as bytes
+    straight from the mapping instead, unless it has non-ASCII bytes,
+    which only text mode lexes like Lexer does.
+    """
+
+    if use_mmap:
+        with open(path, 'rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            if NON_ASCII.search(source) is None:
+                return parser_class(ChunkedLexer(source, chunk_size)).parse()
+    with open(path, encoding='utf-8') as file:
+        return parser_class(ChunkedLexer(file, chunk_size)).parse()
+
+
+def run(tree, engine='slots', optimize=False, check_types=True, symbol_table=None):
+    """Analyzes and runs tree, printing its symbol table and GLOBAL_SCOPE.
+
+    tree can also be a CompiledProgram, which is run as it is: it has been
+    analyzed already and may be shared, so it is not annotated again.
+    """
+
+    if isinstance(tree, CompiledProgram):
+        tree, symbol_table = tree.tree, tree.symbol_table
+        optimize = False
+    else:
+        original = tree
+        tree, symbol_table = analyze_tree(tree, optimize, check_types, symbol_table)
+    print()
+    print(symbol_table)
+    print()
+    if optimize:
+        # Imported here since optimizer imports this module
+        import optimizer
+        removed = optimizer.count_nodes(original) - optimizer.count_nodes(tree)
+        print(f'Optimizer removed {removed} nodes')
+        print()
+    global_scope = execute(tree, engine, symbol_table)
+    print('GLOBAL_SCOPE: ')
+    for k, v in sorted(global_scope.items()):
+        print(f'{k} = {v}')
+
+
+def run_file(path, engine='slots', optimize=False, check_types=True, use_mmap=False):
+    run(parse_file(path, use_mmap=use_mmap), engine, optimize, check_types)
+
+
+def main(lexer_class=Lexer, parser_class=Parser, engine='slots', optimize=False,
+         check_types=True, use_cache=True, incremental=False):
+    """Reads and runs one program per line.
+
+    With incremental set, every line is treated as an edit of the previous
+    one and parsed by IncrementalParser, which reuses what didn't change.
+    """
+
+    show_symbol_log()
+    # Imported here since cache and incremental import this module
+    from cache import PARSE_CACHE
+    from incremental import IncrementalParser, difference
+    incremental_parser = None
     while True:
         try:
             text = input('input>')
@@ -668,16 +1757,17 @@ def main():
             break
         if not text:
             continue
-        lexer = Lexer(text)
-        parser = Parser(lexer)
-        interpreter = Interpreter(parser)
-        symtab = SymbolTableBuilder()
-        tree = parser.parse()
-        symtab.visit(tree)
-        print()
-        print(symtab.symbol_table)
-        print()
-        interpreter.visit(tree)
-        print('GLOBAL_SCOPE: ')
-        for k, v in sorted(interpreter.GLOBAL_SCOPE.items()):
-            print(f'{k} = {v}')
+        if incremental:
+            if incremental_parser is None:
+                incremental_parser = IncrementalParser(text)
+            else:
+                incremental_parser.edit(*difference(incremental_parser.text, text))
+            run(incremental_parser.tree, engine, optimize, check_types)
+            continue
+        if use_cache and check_types:
+            # Cached programs are analyzed once and never annotated again
+            run(PARSE_CACHE.compiled(text, lexer_class, parser_class, optimize), engine)
+            continue
+        lexer = lexer_class(text)
+        parser = parser_class(lexer)
+        run(parser.parse(), engine, optimize, check_types)
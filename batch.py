@@ -0,0 +1,202 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+import json
+import os
+import sys
+import time
+
+from LPI import *
+from typechecker import check_types
+
+
+class Result(object):
+    """Outcome of one program: its GLOBAL_SCOPE, or the error it stopped with"""
+
+    def __init__(self, name, global_scope=None, error=None):
+        self.name = name
+        self.global_scope = global_scope
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_dict(self):
+        return {'name': self.name, 'global_scope': self.global_scope, 'error': self.error}
+
+    def __str__(self):
+        if self.ok:
+            return f'{self.name}: {self.global_scope}'
+        return f'{self.name}: {self.error}'
+
+    __repr__ = __str__
+
+
+class BatchReport(object):
+    def __init__(self, results, seconds):
+        self.results = results
+        self.seconds = seconds
+
+    @property
+    def failed(self):
+        return sum(not result.ok for result in self.results)
+
+    @property
+    def throughput(self):
+        """Programs per second"""
+
+        return len(self.results) / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f'{len(self.results)} programs, {self.failed} failed, {self.seconds:.2f} s, '
+                f'{self.throughput:.0f} programs/s')
+
+    __repr__ = __str__
+
+
+def run_program(name, text, engine='slots'):
+    """Result of the program; text can also be the exception reading it failed with"""
+
+    try:
+        if isinstance(text, Exception):
+            raise text
+        tree = Parser(FastLexer(text)).parse()
+        symtab = SymbolTableBuilder()
+        symtab.visit(tree)
+        check_types(tree)
+        return Result(name, execute(tree, engine, symtab.symbol_table))
+    except Exception as e:
+        return Result(name, error=f'{type(e).__name__}: {e}')
+
+
+def run_chunk(chunk, engine):
+    return [run_program(name, text, engine) for name, text in chunk]
+
+
+class BatchRunner(object):
+    """Runs (name, text) sources on a ProcessPoolExecutor, chunk_size per task.
+
+    At most max_pending chunks are in flight, so sources can be a lazy
+    iterable of any length. Errors in a program end up in its Result. If
+    a worker process dies, every chunk in flight fails with it: the pool
+    is restarted and their programs are run again one at a time, so only
+    the one that kills a worker again is reported as failed.
+    """
+
+    def __init__(self, workers=None, chunk_size=64, engine='slots', max_pending=None):
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.engine = engine
+        self.max_pending = max_pending or 2 * self.workers
+        self.executor = None
+        self.pending = deque()
+
+    def start(self):
+        self.executor = ProcessPoolExecutor(self.workers)
+
+    def restart(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def run_alone(self, name, text):
+        try:
+            return self.executor.submit(run_program, name, text, self.engine).result()
+        except BrokenProcessPool:
+            self.restart()
+            return Result(name, error='BrokenProcessPool: the worker process died')
+
+    def submit(self, chunk):
+        try:
+            future = self.executor.submit(run_chunk, chunk, self.engine)
+        except BrokenProcessPool:
+            # A chunk already in flight killed a worker; collect() sorts it out
+            future = Future()
+            future.set_exception(BrokenProcessPool())
+        self.pending.append((chunk, future))
+
+    def collect(self):
+        chunk, future = self.pending.popleft()
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            suspects = chunk + [item for other, _ in self.pending for item in other]
+            self.pending.clear()
+            self.restart()
+            return [self.run_alone(name, text) for name, text in suspects]
+
+    def run(self, sources):
+        """Yields a Result for every source, in order"""
+
+        sources = iter(sources)
+        self.start()
+        try:
+            while True:
+                chunk = list(islice(sources, self.chunk_size))
+                if not chunk:
+                    break
+                self.submit(chunk)
+                if len(self.pending) >= self.max_pending:
+                    yield from self.collect()
+            while self.pending:
+                yield from self.collect()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+            self.pending.clear()
+
+
+def run_batch(sources, workers=None, chunk_size=64, engine='slots'):
+    """Runs every (name, text) in sources and returns a BatchReport"""
+
+    start = time.perf_counter()
+    results = list(BatchRunner(workers, chunk_size, engine).run(sources))
+    return BatchReport(results, time.perf_counter() - start)
+
+
+def read_sources(paths, extension='.pas'):
+    """(path, text) of every file given and every file with extension in directories given.
+
+    Files are read as UTF-8. A file that can't be read gives the exception
+    in place of its text, so only its own Result fails.
+    """
+
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(extension):
+                    yield from read_sources([os.path.join(path, name)], extension)
+        else:
+            try:
+                with open(path, encoding='utf-8') as file:
+                    text = file.read()
+            except (OSError, UnicodeDecodeError) as e:
+                text = e
+            yield path, text
+
+
+def main(args):
+    """batch <file or directory>... [--workers=N] [--chunk-size=N] [--engine=NAME] [--json]
+
+    Prints a line per program (a JSON object with --json) and the totals.
+    """
+
+    options = {'workers': None, 'chunk-size': 64, 'engine': 'slots'}
+    paths = []
+    as_json = False
+    for arg in args:
+        if arg == '--json':
+            as_json = True
+        elif arg.startswith('--'):
+            key, _, value = arg[2:].partition('=')
+            options[key] = value if key == 'engine' else int(value)
+        else:
+            paths.append(arg)
+
+    start = time.perf_counter()
+    results = []
+    runner = BatchRunner(options['workers'], options['chunk-size'], options['engine'])
+    for result in runner.run(read_sources(paths)):
+        print(json.dumps(result.to_dict()) if as_json else result)
+        results.append(result)
+    print(BatchReport(results, time.perf_counter() - start), file=sys.stderr)
@@ -0,0 +1,243 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+
+from LPI import *
+from batch import run_batch
+from cache import count_tree_nodes
+from incremental import IncrementalParser
+from scheduler import Scheduler
+from vectorized import numpy, run_vectorized
+
+
+def generate_expression(rand, names, depth=0):
+    if depth > 5 or rand.random() < 0.25:
+        choice = rand.random()
+        if choice < 0.4:
+            return str(rand.randint(1, 20))
+        if choice < 0.55:
+            return f'{rand.randint(1, 9)}.{rand.randint(1, 99)}'
+        return rand.choice(names)
+    choice = rand.random()
+    if choice < 0.1:
+        return '-' + generate_expression(rand, names, depth + 1)
+    if choice < 0.2:
+        return generate_expression(rand, names, depth + 1) + ' / ' + str(rand.randint(1, 9))
+    return (f'({generate_expression(rand, names, depth + 1)} {rand.choice("+-*")} '
+            f'{generate_expression(rand, names, depth + 1)})')
+
+
+def generate_program(statements, seed=0):
+    """Program with `statements` random assignments that never divide by zero"""
+
+    rand = random.Random(seed)
+    names = ['a', 'b', 'c', 'x', 'y']
+    lines = ['PROGRAM bench;', 'VAR a, b, c, x, y : REAL;', 'BEGIN',
+             '  a := 1; b := 2; c := 3; x := 1.5; y := 2.5;']
+    for _ in range(statements):
+        lines.append(f'  {rand.choice(names)} := ({generate_expression(rand, names)}) / 1000;')
+    lines.append('END.')
+    return '\n'.join(lines)
+
+
+def parse(text):
+    return Parser(FastLexer(text)).parse()
+
+
+def best_of(function, number=10, repeat=5):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def count_tokens(lexer):
+    count = 1
+    while lexer.get_next_token().type != EOF:
+        count += 1
+    return count
+
+
+def bench_lexing():
+    """Lexer, FastLexer.get_next_token and FastLexer.tokenize on the same programs"""
+
+    long_names = generate_program(10000).replace('a', 'alpha_value').replace('x', 'x_coordinate')
+    for name, text in (('10000 statements', generate_program(10000)),
+                       ('long identifiers', long_names)):
+        tokens = count_tokens(FastLexer(text))
+        print(f'{name}, {tokens} tokens:', end=' ')
+        results = []
+        for label, function in (('Lexer', lambda: count_tokens(Lexer(text))),
+                                ('FastLexer', lambda: count_tokens(FastLexer(text))),
+                                ('tokenize', lambda: FastLexer(text).tokenize())):
+            seconds = best_of(function, number=1, repeat=3)
+            results.append(f'{label} {seconds * 1000:.0f} ms ({tokens / seconds / 1e6:.2f}M tokens/s)')
+        print(', '.join(results))
+
+
+def bench_traversal():
+    """IterativeNodeVisitor.visit against visit_recursive on the same hooks"""
+
+    tree = parse(generate_program(2000))
+    iterative = best_of(lambda: Interpreter(None).visit(tree))
+    recursive = best_of(lambda: Interpreter(None).visit_recursive(tree))
+    print(f'Interpreter, 2000 statements: iterative {iterative * 1000:.2f} ms, '
+          f'recursive {recursive * 1000:.2f} ms ({recursive / iterative:.2f}x)')
+
+    depth = 20000
+    text = f'PROGRAM deep; BEGIN a := {"(" * depth}1{")" * depth} + {"- " * depth}1 END.'
+    tree = PrattParser(FastLexer(text)).parse()
+    interpreter = Interpreter(None)
+    print(f'Interpreter, depth {depth}: iterative', end=' ')
+    interpreter.visit(tree)
+    print(f'ok ({interpreter.GLOBAL_SCOPE})', end=', recursive ')
+    try:
+        Interpreter(None).visit_recursive(tree)
+        print('ok')
+    except RecursionError:
+        print('RecursionError')
+
+
+def bench_ast_memory():
+    """Bytes per AST node retained after parsing, measured with tracemalloc"""
+
+    text = generate_program(40000)
+    for lexer_class in (Lexer, FastLexer):
+        tracemalloc.start()
+        tree = Parser(lexer_class(text)).parse()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        nodes = count_tree_nodes(tree)
+        print(f'{lexer_class.__name__}: {nodes} nodes, {size / 2 ** 20:.1f} MiB, '
+              f'{size / nodes:.1f} bytes/node')
+        del tree
+
+
+def bench_parallel_lexing():
+    """FastLexer.tokenize against parallel_tokenize on one large program"""
+
+    text = generate_program(50000)
+    sequential = best_of(lambda: FastLexer(text).tokenize(), number=1, repeat=3)
+    print(f'{len(text) / 2 ** 20:.1f} MiB, {os.cpu_count()} CPUs: '
+          f'sequential {sequential * 1000:.0f} ms')
+    for workers in (2, 4, 8):
+        parallel = best_of(lambda: parallel_tokenize(text, workers, min_piece_size=1 << 16),
+                           number=1, repeat=3)
+        print(f'{workers} workers: {parallel * 1000:.0f} ms ({sequential / parallel:.2f}x)')
+
+
+def bench_incremental():
+    """IncrementalParser.edit against a full parse after a one-character edit"""
+
+    for statements in (2000, 20000):
+        text = generate_program(statements)
+        parser = IncrementalParser(text)
+        offset = text.index(':=', len(text) // 2) - 2
+        full = best_of(lambda: Parser(FastLexer(text)).parse(), number=1, repeat=3)
+
+        def edit():
+            # Renames a variable back and forth, one character each way
+            name = parser.text[offset]
+            other = 'b' if name == 'a' else 'a'
+            parser.edit(offset, 1, other)
+
+        incremental = best_of(edit, number=100)
+        print(f'{statements} statements: full parse {full * 1000:.1f} ms, '
+              f'edit {incremental * 1000:.3f} ms ({full / incremental:.0f}x)')
+
+
+def bench_batch():
+    """run_batch over 400 small programs, by number of worker processes"""
+
+    sources = [(f'program{i}', generate_program(50, seed=i)) for i in range(400)]
+    for workers in (1, 2, 4):
+        report = run_batch(sources, workers, chunk_size=16)
+        print(f'{workers} workers: {report}')
+
+
+def bench_vectorized():
+    """run_vectorized over a million starting values against an Interpreter walk per row"""
+
+    if numpy is None:
+        print('NumPy is not installed')
+        return
+    rand = random.Random(0)
+    names = ['a', 'b', 'c', 'x', 'y']
+    statements = [f'{rand.choice(names)} := ({generate_expression(rand, names)}) / 1000'
+                  for _ in range(20)]
+    tree = parse(f'PROGRAM bench; VAR a, b, c, x, y : REAL; BEGIN {"; ".join(statements)} END.')
+    rows = 1000000
+    bindings = {name: numpy.random.default_rng(i).uniform(1, 2, rows)
+                for i, name in enumerate(names)}
+    vectorized = best_of(lambda: run_vectorized(tree, bindings), number=1, repeat=3)
+
+    def walk(row=0):
+        interpreter = Interpreter(None)
+        interpreter.GLOBAL_SCOPE = {name: float(values[row]) for name, values in bindings.items()}
+        interpreter.visit(tree)
+
+    scalar = best_of(walk, number=100) * rows
+    print(f'{rows} rows: vectorized {vectorized:.2f} s, Interpreter per row {scalar:.0f} s '
+          f'(estimated, {scalar / vectorized:.0f}x)')
+
+
+def bench_scheduler():
+    """Latency of small programs queued behind a big one, run in order and by Scheduler"""
+
+    big = generate_program(20000)
+    small = [generate_program(20, seed=i) for i in range(100)]
+
+    for quota in (None, 100, 1000, 10000):
+        # Without a quota, each program runs to the end before the next one starts
+        scheduler = Scheduler(quota or 1 << 30)
+        tasks = [scheduler.submit(text) for text in [big, *small]]
+        start = time.monotonic()
+        scheduler.run()
+        latencies = sorted(task.finished - start for task in tasks[1:])
+        print(f'{f"quota {quota}" if quota else "in order"}: small p50 '
+              f'{latencies[50] * 1000:.1f} ms, p99 {latencies[99] * 1000:.1f} ms, '
+              f'big {(tasks[0].finished - start) * 1000:.0f} ms')
+
+
+def bench_threads():
+    """One CompiledProgram executed concurrently by 1 to 8 threads"""
+
+    program = CompiledProgram.from_source(generate_program(2000))
+    expected = repr(program.execute())
+    runs = 64
+    single = None
+    for threads in (1, 2, 4, 8):
+        with ThreadPoolExecutor(threads) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(lambda _: program.execute(), range(runs)))
+            elapsed = time.perf_counter() - start
+        assert all(repr(result) == expected for result in results)
+        single = single or elapsed
+        print(f'{threads} threads: {runs / elapsed:.0f} runs/s ({single / elapsed:.2f}x)')
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f'GIL {"enabled" if gil else "disabled"}, {os.cpu_count()} CPUs')
+
+
+BENCHMARKS = {
+    'lexing': bench_lexing,
+    'traversal': bench_traversal,
+    'ast_memory': bench_ast_memory,
+    'parallel_lexing': bench_parallel_lexing,
+    'incremental': bench_incremental,
+    'batch': bench_batch,
+    'vectorized': bench_vectorized,
+    'scheduler': bench_scheduler,
+    'threads': bench_threads,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f'== {name} ==')
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
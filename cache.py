@@ -0,0 +1,121 @@
+from collections import OrderedDict
+import hashlib
+import threading
+
+from LPI import *
+
+
+# Bytes per AST node measured by benchmarks.py ast_memory
+NODE_SIZE = 56
+# Bytes per character of a Python translation, its source and compiled code
+TRANSLATION_SIZE = 6
+
+
+def count_tree_nodes(tree):
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        for name in ('left', 'right', 'expr', 'block', 'compound_statement',
+                     'var_node', 'type_node'):
+            child = getattr(node, name, None)
+            if isinstance(child, AST):
+                stack.append(child)
+        stack.extend(getattr(node, 'children', ()))
+        stack.extend(getattr(node, 'declarations', ()))
+    return count
+
+
+def approximate_size(text, value):
+    """Approximate bytes held by a cache entry: the AST or translation plus the source"""
+
+    # Imported here since translators imports this module
+    from translators import PythonTranslator
+    if isinstance(value, PythonTranslator):
+        return len(value.source) * TRANSLATION_SIZE + len(text)
+    tree = value.tree if isinstance(value, CompiledProgram) else value
+    return count_tree_nodes(tree) * NODE_SIZE + len(text)
+
+
+class ParseCache(object):
+    """LRU cache of parse results keyed by kind and a hash of the source.
+
+    Entries are dropped least recently used first once there are more
+    than max_entries of them or their approximate size exceeds max_bytes.
+    A result bigger than max_bytes on its own is returned but not stored.
+    One cache can be shared by any number of threads and interpreters:
+    the bookkeeping is done under a lock and parsing runs outside it.
+    Cached results are shared, so they must only be read. The engines
+    only read a tree, but analysis passes such as check_types write to
+    it: cache analyzed programs with compiled(), which does every pass
+    before the result is stored.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 << 20, size=approximate_size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = size
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(kind, text):
+        return kind, hashlib.sha256(text.encode()).digest()
+
+    def get(self, kind, text, build):
+        """Cached build(text) for this kind of result, building it on a miss"""
+
+        key = self.key(kind, text)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = build(text)
+        size = self.size(text, value)
+        if size > self.max_bytes:
+            return value
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (value, size)
+                self.bytes += size
+                while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                    _, (_, evicted_size) = self.entries.popitem(last=False)
+                    self.bytes -= evicted_size
+                    self.evictions += 1
+        return value
+
+    def compiled(self, text, lexer_class=FastLexer, parser_class=Parser, optimize=False):
+        """CompiledProgram of a whole program, safe to share between threads"""
+
+        return self.get('optimized' if optimize else 'compiled', text,
+                        lambda text: CompiledProgram.from_source(text, optimize, lexer_class,
+                                                                 parser_class))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+
+# Shared by LPI.main, translators and anyone who doesn't need a cache of their own
+PARSE_CACHE = ParseCache()
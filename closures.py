@@ -0,0 +1,214 @@
+import operator
+
+from errors import UNSUPPORTED_PROCEDURE_CALL
+from LPI import Lexer, Parser, IterativeNodeVisitor, BinOp, UnOp, Num, error, lang
+from tokens import REAL
+
+
+class ClosureCompiler(IterativeNodeVisitor):
+    """Turns the tree into nested closures that take the scope dict.
+
+    Each leave_* returns a callable with its children and operator already
+    bound, so running the program is a single call and no visitor dispatch
+    happens at run time. The tree is walked on an explicit stack; a chain
+    of LOOP_CHAIN or more left-associative BinOps becomes one closure
+    looping over its operands and a chain of UnOps one sign, so neither
+    nests a call per node at run time.
+
+    When the tree went through TypeChecker, handlers are specialized on the
+    types it recorded: INTEGER constants feeding a REAL operation are
+    converted to float at compile time instead of on every run, and
+    assignments of INTEGER values to REAL variables convert once.
+    """
+
+    BINARY_OPERATORS = {
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '/': operator.truediv,
+        'DIV': operator.floordiv
+    }
+    # Chains of this many BinOps or more run as a loop, shorter ones nest
+    LOOP_CHAIN = 8
+
+    @staticmethod
+    def constant(node, other):
+        """Value of a Num operand, as float if the other operand is REAL"""
+
+        if getattr(other, 'type', None) == REAL:
+            return float(node.value)
+        return node.value
+
+    @staticmethod
+    def chain(node):
+        """The BinOps down the left of node, innermost first"""
+
+        nodes = []
+        while isinstance(node, BinOp):
+            nodes.append(node)
+            node = node.left
+        nodes.reverse()
+        return nodes
+
+    @staticmethod
+    def signs(node):
+        """(operand under the chain of UnOps at node, whether the chain negates it)"""
+
+        negative = False
+        while isinstance(node, UnOp):
+            if node.op.value == '-':
+                negative = not negative
+            node = node.expr
+        return node, negative
+
+    def children_BinOp(self, node):
+        nodes = self.chain(node)
+        operands = [nodes[0].left] + [n.right for n in nodes]
+        return [n for n in operands if not isinstance(n, Num)]
+
+    @classmethod
+    def binary(cls, node, left, operands):
+        """Closure of node, given the one of its left operand"""
+
+        op = cls.BINARY_OPERATORS[node.op.value]
+        if isinstance(node.right, Num):
+            right_value = cls.constant(node.right, node.left)
+            return lambda scope: op(left(scope), right_value)
+        right = next(operands)
+        return lambda scope: op(left(scope), right(scope))
+
+    def leave_BinOp(self, node, *operands):
+        nodes = self.chain(node)
+        operands = iter(operands)
+        if isinstance(nodes[0].left, Num):
+            left_value = self.constant(nodes[0].left, nodes[0].right)
+            left = lambda scope: left_value
+        else:
+            left = next(operands)
+
+        if len(nodes) < self.LOOP_CHAIN:
+            for n in nodes:
+                left = self.binary(n, left, operands)
+            return left
+
+        # A long chain runs as one loop instead of a nested call per BinOp
+        steps = []
+        for n in nodes:
+            op = self.BINARY_OPERATORS[n.op.value]
+            if isinstance(n.right, Num):
+                steps.append((op, self.constant(n.right, n.left), True))
+            else:
+                steps.append((op, next(operands), False))
+        steps = tuple(steps)
+
+        def chain(scope):
+            value = left(scope)
+            for op, right, constant in steps:
+                value = op(value, right if constant else right(scope))
+            return value
+
+        return chain
+
+    def leave_Num(self, node):
+        value = node.value
+        return lambda scope: value
+
+    def children_UnOp(self, node):
+        expr, _ = self.signs(node)
+        return () if isinstance(expr, Num) else (expr,)
+
+    def leave_UnOp(self, node, *operand):
+        # Unary + changes no number and two - cancel out, so a chain is one sign
+        expr, negative = self.signs(node)
+        if isinstance(expr, Num):
+            value = -expr.value if negative else expr.value
+            return lambda scope: value
+        expr, = operand
+        if negative:
+            return lambda scope: -expr(scope)
+        return expr
+
+    def leave_Compound(self, node, *statements):
+        statements = tuple(filter(None, statements))
+
+        def compound(scope):
+            for statement in statements:
+                statement(scope)
+
+        return compound
+
+    def children_AssignOp(self, node):
+        return node.right,
+
+    def leave_AssignOp(self, node, right):
+        name = node.left.value
+
+        if getattr(node, 'promote', False):
+            def assign(scope):
+                scope[name] = float(right(scope))
+        else:
+            def assign(scope):
+                scope[name] = right(scope)
+
+        return assign
+
+    def leave_Var(self, node):
+        name = node.value
+
+        def var(scope):
+            try:
+                return scope[name]
+            except KeyError:
+                raise NameError(repr(name)) from None
+
+        return var
+
+    def leave_Program(self, node, block):
+        return block
+
+    def leave_Block(self, node, *results):
+        return results[-1]
+
+    def children_ProcedureDecl(self, node):
+        return ()
+
+    def leave_ProcedureDecl(self, node):
+        return None
+
+    def leave_ProcedureCall(self, node):
+        error(UNSUPPORTED_PROCEDURE_CALL[lang])
+
+    def children_VarDecl(self, node):
+        return ()
+
+    def leave_VarDecl(self, node):
+        return None
+
+    def leave_NoOp(self, node):
+        return None
+
+    def compile(self, tree):
+        """Returns run(scope=None) that executes the program and returns its GLOBAL_SCOPE.
+
+        The initial scope is copied, so one compiled program can be run
+        any number of times with different starting values.
+        """
+
+        body = self.visit(tree)
+
+        def run(scope=None):
+            scope = {} if scope is None else dict(scope)
+            body(scope)
+            return scope
+
+        return run
+
+
+def compile_program(tree):
+    return ClosureCompiler().compile(tree)
+
+
+def compile_text(text):
+    lexer = Lexer(text)
+    parser = Parser(lexer)
+    return compile_program(parser.parse())
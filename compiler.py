@@ -0,0 +1,159 @@
+import os
+
+from LPI import Lexer, FastLexer, Parser, IterativeNodeVisitor, Num, analyze_tree
+from tokens import REAL
+from vm import *
+
+
+class Compiler(IterativeNodeVisitor):
+    """Compiles a Program tree into a linear Code object for VirtualMachine
+
+    Uses the types recorded by TypeChecker when present: INTEGER constants
+    feeding a REAL operation are stored as float, and INTEGER values
+    assigned to REAL variables are converted with TO_REAL.
+    """
+
+    BINARY_OPCODES = {'+': ADD, '-': SUB, '*': MUL, '/': DIV, 'DIV': INT_DIV}
+    CONST_OPCODES = {'+': ADD_CONST, '-': SUB_CONST, '*': MUL_CONST, '/': DIV_CONST,
+                     'DIV': INT_DIV_CONST}
+
+    def __init__(self):
+        super().__init__()
+        self.instructions = []
+        self.constants = []
+        self.names = []
+        self._constant_index = {}
+        self._name_index = {}
+
+    def emit(self, op, arg=0):
+        self.instructions.append((op, arg))
+
+    def constant(self, value):
+        # Type is part of the key because 1 == 1.0 for dict lookups
+        key = (type(value), value)
+        if key not in self._constant_index:
+            self._constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return self._constant_index[key]
+
+    def name(self, name):
+        if name not in self._name_index:
+            self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return self._name_index[name]
+
+    @staticmethod
+    def operand(node, other):
+        """Value of a Num operand, as float if the other operand is REAL"""
+
+        if getattr(other, 'type', None) == REAL:
+            return float(node.value)
+        return node.value
+
+    def enter_BinOp(self, node):
+        # A constant left operand is loaded before the right operand is compiled
+        if isinstance(node.left, Num):
+            self.emit(LOAD_CONST, self.constant(self.operand(node.left, node.right)))
+
+    def children_BinOp(self, node):
+        return [n for n in (node.left, node.right) if not isinstance(n, Num)]
+
+    def leave_BinOp(self, node, *operands):
+        if isinstance(node.right, Num):
+            value = self.operand(node.right, node.left)
+            self.emit(self.CONST_OPCODES[node.op.value], self.constant(value))
+        else:
+            self.emit(self.BINARY_OPCODES[node.op.value])
+
+    def leave_Num(self, node):
+        self.emit(LOAD_CONST, self.constant(node.value))
+
+    def children_UnOp(self, node):
+        if node.op.value == '-' and isinstance(node.expr, Num):
+            return ()
+        return node.expr,
+
+    def leave_UnOp(self, node, *operand):
+        if node.op.value != '-':
+            return
+        if operand:
+            self.emit(NEG)
+        else:
+            self.emit(LOAD_CONST, self.constant(-node.expr.value))
+
+    def leave_Compound(self, node, *results):
+        return None
+
+    def children_AssignOp(self, node):
+        return node.right,
+
+    def leave_AssignOp(self, node, value):
+        if getattr(node, 'promote', False):
+            self.emit(TO_REAL)
+        self.emit(STORE_VAR, self.name(node.left.value))
+
+    def leave_Var(self, node):
+        self.emit(LOAD_VAR, self.name(node.value))
+
+    def leave_Program(self, node, block):
+        self.emit(HALT)
+
+    def leave_Block(self, node, *results):
+        return None
+
+    def children_ProcedureDecl(self, node):
+        return ()
+
+    def leave_ProcedureDecl(self, node):
+        return None
+
+    def leave_ProcedureCall(self, node):
+        error(UNSUPPORTED_PROCEDURE_CALL[lang])
+
+    def children_VarDecl(self, node):
+        return ()
+
+    def leave_VarDecl(self, node):
+        return None
+
+    def leave_NoOp(self, node):
+        return None
+
+    def compile(self, tree):
+        self.visit(tree)
+        return Code(self.instructions, self.constants, self.names)
+
+
+def compile_program(tree):
+    return Compiler().compile(tree)
+
+
+def compile_text(text):
+    lexer = Lexer(text)
+    parser = Parser(lexer)
+    return compile_program(parser.parse())
+
+
+def compile_source(text, optimize=False):
+    """Code for a whole program with its global symbols and source hash filled in.
+
+    The VM has no procedure calls, so a program that calls a procedure is
+    refused with UNSUPPORTED_PROCEDURE_CALL before anything is written.
+    """
+
+    tree, symbol_table = analyze_tree(Parser(FastLexer(text)).parse(), optimize)
+    code = compile_program(tree)
+    code.symbols = tuple((symbol.name, symbol.type.name) for symbol in symbol_table.slots)
+    code.source_hash = source_hash(text)
+    return code
+
+
+def compile_file(path, output=None, optimize=False):
+    """Precompiles the program at path, by default into the same name with .mylc"""
+
+    with open(path) as file:
+        text = file.read()
+    if output is None:
+        output = os.path.splitext(path)[0] + '.mylc'
+    save(compile_source(text, optimize), output)
+    return output
@@ -4,4 +4,18 @@ INVALID_SYNTAX = {'en': 'Invalid syntax'}
 DIVIDING_BY_ZERO = {'en': 'Error dividing by 0'}
 INVALID_CHAR = {'en': 'Invalid character'}
 COMMENT_CLOSING = {'en': 'Comment is not closed'}
-DUPLICATE_DECLARATION = {'en': 'Duplicate identifier declaration'}
\ No newline at end of file
+DUPLICATE_DECLARATION = {'en': 'Duplicate identifier declaration'}
+UNKNOWN_OPCODE = {'en': 'Unknown opcode'}
+UNKNOWN_ENGINE = {'en': 'Unknown execution engine'}
+CALL_DEPTH_EXCEEDED = {'en': 'Maximum procedure call depth exceeded'}
+INVALID_DIV_OPERANDS = {'en': 'DIV operands must be INTEGER'}
+INCOMPATIBLE_ASSIGNMENT = {'en': 'REAL value can not be assigned to INTEGER variable'}
+INVALID_PRECOMPILED = {'en': 'Not a precompiled program'}
+PRECOMPILED_VERSION = {'en': 'Unsupported precompiled program format version'}
+STALE_PRECOMPILED = {'en': 'Precompiled program is out of date with its source'}
+NUMPY_REQUIRED = {'en': 'Vectorized evaluation needs NumPy installed'}
+DEADLINE_EXCEEDED = {'en': 'Task did not finish before its deadline'}
+STEP_BUDGET_EXCEEDED = {'en': 'Task ran out of steps'}
+TASK_CANCELLED = {'en': 'Task was cancelled'}
+UNSUPPORTED_PROCEDURE_CALL = {'en': 'Procedure calls are only supported by the slots engine'}
+NON_ASCII_BYTES = {'en': 'Non-ASCII characters can only be lexed from text, not bytes'}
\ No newline at end of file
@@ -0,0 +1,424 @@
+from bisect import bisect_left
+import random
+
+from LPI import *
+
+
+class Span(object):
+    """What a node took in the last parse, kept so the next parse can reuse it.
+
+    length is the number of tokens of the node. parts are the spans of the
+    children that can be reused one by one: (var section, procedures,
+    compound statement) of a Block, the block of a ProcedureDecl and the
+    statements of a Compound. starts are the offsets of a Compound's
+    statements from its BEGIN.
+    """
+
+    __slots__ = ('node', 'length', 'parts', 'starts')
+
+    def __init__(self, node, length, parts=None, starts=None):
+        self.node = node
+        self.length = length
+        self.parts = parts
+        self.starts = starts
+
+
+class IncrementalParser(Parser):
+    """Parser that keeps its tokens and tree and updates them edit by edit.
+
+    edit(offset, removed, inserted) relexes from the token before the edit
+    until the new tokens line up with the old ones again. It then parses
+    with the previous tree at hand: a Block, ProcedureDecl, Compound or
+    statement whose tokens, and the token right after them, were not
+    touched is reused as it is, and runs of untouched statements are
+    sliced out of the old Compound. The work done depends on the size of
+    the edit and the nesting around it, not on the size of the program.
+
+    Token ends are kept like in a gap buffer: tokens before self.gap store
+    their offset from the start of the text, the others from its end, so
+    an edit doesn't move the tokens that follow it. An edit that makes
+    the program invalid raises and leaves the parser as it was.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.lexer = FastLexer(text)
+        self.tokens = []
+        self.ends = []
+        while True:
+            token = self.lexer.get_next_token()
+            self.tokens.append(token)
+            self.ends.append(self.lexer.pos)
+            if token.type == EOF:
+                break
+        self.gap = len(self.tokens)
+        self.constants = {}
+        # The last edit replaced old tokens [first, old_last) with [first, new_last)
+        self.first = self.old_last = self.new_last = 0
+        self.span = None
+        self.reparse()
+
+    @property
+    def tree(self):
+        return self.span.node
+
+    def parse(self):
+        return self.tree
+
+    ##########
+    # Tokens #
+    ##########
+
+    def end(self, index):
+        end = self.ends[index]
+        return end if index < self.gap else end + len(self.text)
+
+    def move_gap(self, index):
+        ends = self.ends
+        size = len(self.text)
+        for i in range(self.gap, index):
+            ends[i] += size
+        for i in range(index, self.gap):
+            ends[i] -= size
+        self.gap = index
+
+    def find(self, offset):
+        """Index of the first token ending at or after offset"""
+
+        gap = self.gap
+        if gap and self.ends[gap - 1] >= offset:
+            return bisect_left(self.ends, offset, 0, gap)
+        return bisect_left(self.ends, offset - len(self.text), gap, len(self.ends))
+
+    def edit(self, offset, removed, inserted):
+        """Replaces removed characters at offset with inserted and returns the new tree"""
+
+        text = self.text
+        new_text = text[:offset] + inserted + text[offset + removed:]
+        delta = len(inserted) - removed
+
+        first = self.find(offset)
+        lexer = FastLexer(new_text)
+        lexer.pos = self.end(first - 1) if first else 0
+        tokens = []
+        ends = []
+        last = first
+        while True:
+            token = lexer.get_next_token()
+            tokens.append(token)
+            ends.append(lexer.pos)
+            if token.type == EOF:
+                last = len(self.tokens) - 1
+                break
+            if lexer.pos < offset + len(inserted):
+                continue
+            # Past the edit, the texts are the same: lexing goes on exactly
+            # as before from any end shared by an old and a new token
+            old_end = lexer.pos - delta
+            if old_end < offset + removed:
+                continue
+            while self.end(last) < old_end:
+                last += 1
+            if self.end(last) == old_end and self.tokens[last].type != EOF:
+                break
+        old_last = last + 1
+
+        self.move_gap(old_last)
+        old_tokens = self.tokens[first:old_last]
+        old_ends = self.ends[first:old_last]
+        self.tokens[first:old_last] = tokens
+        self.ends[first:old_last] = ends
+        self.gap = first + len(tokens)
+        self.text = new_text
+        self.first, self.old_last, self.new_last = first, old_last, first + len(tokens)
+        try:
+            return self.reparse()
+        except Exception:
+            self.tokens[first:self.new_last] = old_tokens
+            self.ends[first:self.new_last] = old_ends
+            self.gap = old_last
+            self.text = text
+            self.first = self.old_last = self.new_last = 0
+            raise
+
+    ##########
+    # Parser #
+    ##########
+
+    def eat(self, token_type):
+        if self.current_token.type != token_type:
+            error(INVALID_SYNTAX[lang])
+        self.pos += 1
+        self.current_token = self.tokens[self.pos]
+
+    def reparse(self):
+        self.pos = 0
+        self.current_token = self.tokens[0]
+        self.span = self.program_span(self.span)
+        return self.tree
+
+    def old_position(self, pos):
+        """Index the token at pos had before the last edit, None if the edit made it"""
+
+        if pos < self.first:
+            return pos
+        if pos >= self.new_last:
+            return pos - self.new_last + self.old_last
+        return None
+
+    def intact(self, span, start):
+        """Whether the last edit left an old span starting at start alone"""
+
+        return span is not None and (start + span.length < self.first or start >= self.old_last)
+
+    def candidate(self, spans):
+        """(old span, its old start) for the current token, from spans keyed by old start"""
+
+        start = self.old_position(self.pos)
+        return spans.get(start), start
+
+    def skip(self, span):
+        self.pos += span.length
+        self.current_token = self.tokens[self.pos]
+        return span
+
+    def program_span(self, old):
+        self.eat(PROGRAM)
+        name = self.variable().value
+        self.eat(SEMI)
+        block = self.block_span(*self.candidate({3: old.parts} if old is not None else {}))
+        self.eat(DOT)
+        if self.current_token.type != EOF:
+            error(INVALID_SYNTAX[lang])
+
+        if old is not None and block is old.parts and name == old.node.name:
+            node = old.node
+        else:
+            node = Program(name, block.node)
+        return Span(node, self.pos, block)
+
+    def block_span(self, old, start):
+        if self.intact(old, start):
+            return self.skip(old)
+
+        spans = {}
+        if old is not None:
+            var, procedures, compound = old.parts
+            offset = start
+            for part in (var, *procedures, compound):
+                if part is not None:
+                    spans[offset] = part
+                    offset += part.length
+
+        begin = self.pos
+        var = None
+        if self.current_token.type == VAR:
+            var = self.var_span(*self.candidate(spans))
+        procedures = []
+        while self.current_token.type == PROCEDURE:
+            procedures.append(self.procedure_span(*self.candidate(spans)))
+        compound = self.compound_span(*self.candidate(spans))
+
+        parts = (var, procedures, compound)
+        if (old is not None and var is old.parts[0] and compound is old.parts[2]
+                and len(procedures) == len(old.parts[1])
+                and all(new is part for new, part in zip(procedures, old.parts[1]))):
+            return Span(old.node, self.pos - begin, old.parts)
+        declarations = list(var.node) if var is not None else []
+        declarations.extend(procedure.node for procedure in procedures)
+        return Span(Block(declarations, compound.node), self.pos - begin, parts)
+
+    def var_span(self, old, start):
+        if self.intact(old, start):
+            return self.skip(old)
+
+        begin = self.pos
+        self.eat(VAR)
+        declarations = []
+        while self.current_token.type == ID:
+            declarations.extend(self.variable_declaration())
+            self.eat(SEMI)
+        return Span(declarations, self.pos - begin)
+
+    def procedure_span(self, old, start):
+        if self.intact(old, start):
+            return self.skip(old)
+
+        begin = self.pos
+        self.eat(PROCEDURE)
+        name = self.current_token.value
+        self.eat(ID)
+        self.eat(SEMI)
+        block = self.block_span(*self.candidate({start + 3: old.parts} if old is not None else {}))
+        self.eat(SEMI)
+        return Span(ProcedureDecl(name, block.node), self.pos - begin, block)
+
+    def compound_span(self, old, start):
+        if self.intact(old, start):
+            return self.skip(old)
+
+        begin = self.pos
+        self.eat(BEGIN)
+        children = []
+        parts = []
+        starts = []
+        if old is not None:
+            # Statements up to the first one the edit touched are kept as they are
+            first = bisect_left(old.starts, self.first - start)
+            if first and old.starts[first - 1] + old.parts[first - 1].length >= self.first - start:
+                first -= 1
+            if first == len(old.parts):
+                self.pos = begin + old.length - 1
+                self.current_token = self.tokens[self.pos]
+                self.eat(END)
+                return Span(old.node, old.length, old.parts, old.starts)
+            children = old.node.children[:first]
+            parts = old.parts[:first]
+            starts = old.starts[:first]
+            self.pos = begin + old.starts[first]
+            self.current_token = self.tokens[self.pos]
+
+        while True:
+            statement_start = self.pos
+            child = None
+            if old is not None:
+                position = self.old_position(statement_start)
+                if position is not None:
+                    index = bisect_left(old.starts, position - start)
+                    if index < len(old.starts) and old.starts[index] == position - start:
+                        child = old.parts[index]
+                        if position >= self.old_last:
+                            # This and all the following statements come after the edit
+                            shift = statement_start - begin - old.starts[index]
+                            children.extend(old.node.children[index:])
+                            parts.extend(old.parts[index:])
+                            if shift:
+                                starts.extend(offset + shift for offset in old.starts[index:])
+                            else:
+                                starts.extend(old.starts[index:])
+                            self.pos = begin + old.length - 1 + shift
+                            self.current_token = self.tokens[self.pos]
+                            break
+
+            starts.append(statement_start - begin)
+            if self.current_token.type == BEGIN:
+                if child is None or child.parts is None:
+                    child = position = None
+                part = self.compound_span(child, position)
+            else:
+                part = Span(self.statement(), self.pos - statement_start)
+            children.append(part.node)
+            parts.append(part)
+            if self.current_token.type != SEMI:
+                break
+            self.eat(SEMI)
+        self.eat(END)
+
+        root = Compound()
+        root.children = children
+        return Span(root, self.pos - begin, parts, starts)
+
+
+def difference(old, new):
+    """(offset, removed, inserted) edit turning text old into new"""
+
+    size = min(len(old), len(new))
+    # Longest common prefix and then suffix, by bisection on slice comparisons
+    low, high = 0, size
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[:middle] == new[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = low
+    low, high = 0, size - prefix
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[len(old) - middle:] == new[len(new) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return prefix, len(old) - prefix - low, new[prefix:len(new) - low]
+
+
+##########
+# Checks #
+##########
+
+# What the analysis passes attach to nodes; it isn't part of the parse
+ANALYSIS_SLOTS = frozenset(('symbol', 'depth', 'index', 'type', 'promote'))
+
+CHECK_PROGRAM = """PROGRAM check; VAR a, b : INTEGER; y : REAL;
+PROCEDURE p; VAR z : INTEGER; BEGIN z := 1; a := a + z END;
+PROCEDURE q; BEGIN BEGIN b := 2 END; p END;
+BEGIN {start} a := 1; b := 2 * (a + 3); BEGIN y := a / 2; ; q() END; p; a := a DIV 2 END."""
+
+# Inserted by check_edits(): single characters that split, join and break
+# tokens, and whole statements and keywords that change the nesting
+CHECK_INSERTS = tuple('ab;: =+-*/(){}19.') + (
+    '', '', ' a := b * 2; ', ' BEGIN a := 1 END; ', ' BEGIN ', ' END ', ' VAR ', ' PROCEDURE ')
+
+
+def same_tree(a, b):
+    """Whether two trees have the same nodes and parsed fields"""
+
+    pairs = [(a, b)]
+    while pairs:
+        a, b = pairs.pop()
+        if type(a) is not type(b):
+            return False
+        if isinstance(a, list):
+            if len(a) != len(b):
+                return False
+            pairs.extend(zip(a, b))
+        elif isinstance(a, AST):
+            pairs.extend((getattr(a, name, None), getattr(b, name, None))
+                         for name in type(a).__slots__ if name not in ANALYSIS_SLOTS)
+        elif isinstance(a, Token):
+            pairs.append((a.type, b.type))
+            pairs.append((a.value, b.value))
+        elif a != b:
+            return False
+    return True
+
+
+def check_edits(text=CHECK_PROGRAM, count=2000, seed=0):
+    """Makes count random edits to text and checks each against a full parse.
+
+    The edits only depend on seed. An edit must give the same tree as
+    Parser on the new text, or fail when Parser does and leave the
+    IncrementalParser as it was. Returns the number of edits that parsed.
+    """
+
+    rand = random.Random(seed)
+    parser = IncrementalParser(text)
+    parsed = 0
+    for _ in range(count):
+        offset = rand.randrange(len(text) + 1)
+        removed = min(rand.choice((0, 0, 1, 2, 5)), len(text) - offset)
+        inserted = rand.choice(CHECK_INSERTS)
+        new_text = text[:offset] + inserted + text[offset + removed:]
+        try:
+            expected = Parser(FastLexer(new_text)).parse()
+        except Exception:
+            expected = None
+        try:
+            tree = parser.edit(offset, removed, inserted)
+        except Exception:
+            tree = None
+        if expected is None:
+            if tree is not None or parser.text != text:
+                raise AssertionError(f'edit {(offset, removed, inserted)} of {text!r} should fail')
+            continue
+        if tree is None or not same_tree(tree, expected):
+            raise AssertionError(f'edit {(offset, removed, inserted)} of {text!r} parsed differently')
+        text = new_text
+        parsed += 1
+    if not same_tree(parser.tree, Parser(FastLexer(text)).parse()):
+        raise AssertionError(f'{text!r} parsed differently')
+    return parsed
+
+
+if __name__ == '__main__':
+    print(f'{check_edits()} of 2000 edits parsed, all as from scratch')
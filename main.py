@@ -1,13 +1,59 @@
-import LPI
-import translators
+import sys
 
 if __name__ == '__main__':
     '''
-    change to 
-    # calculator.main()
+    python main.py                  - interactive interpreter
+    python main.py <file>           - runs the program in that file
+    python main.py compile <file> [<output>] [--optimize]
+                                    - writes the precompiled program (.mylc)
+    python main.py run <file.mylc> [<source>]
+                                    - runs a precompiled program, checking
+                                      it against its source if given
+    python main.py session          - declarations and statements entered
+                                      one input at a time, see session.py
+    python main.py batch <file or directory>... [--workers=N] [--chunk-size=N]
+                         [--engine=NAME] [--json]
+                                    - runs many programs in worker processes,
+                                      see batch.py
+    python main.py server [--host=HOST] [--port=N] [--unix=PATH] [--workers=N]
+                          [--queue-size=N]
+                                    - serves sessions over a socket, one JSON
+                                      response line per input line, see server.py
+
+    change LPI.main() below to
     translators.main()
     to activate translator
     '''
 
-    LPI.main()
-    # translators.main()
+    # Modules are imported per command, so `run` never loads the parser
+    args = sys.argv[1:]
+    if args[:1] == ['compile']:
+        import compiler
+        optimize = '--optimize' in args
+        paths = [arg for arg in args[1:] if arg != '--optimize']
+        try:
+            print(compiler.compile_file(paths[0], paths[1] if len(paths) > 1 else None, optimize))
+        except Exception as e:
+            # The VM has no procedure calls, so programs with calls are refused here
+            sys.exit(f'Can not compile {paths[0]}: {e}')
+    elif args[:1] == ['run']:
+        import vm
+        vm.run_file(*args[1:3])
+    elif args[:1] == ['session']:
+        import session
+        session.main()
+    elif args[:1] == ['batch']:
+        import batch
+        batch.main(args[1:])
+    elif args[:1] == ['server']:
+        import server
+        server.main(args[1:])
+    elif args:
+        import LPI
+        LPI.show_symbol_log()
+        LPI.run_file(args[0])
+    else:
+        import LPI
+        LPI.main()
+        # import translators
+        # translators.main()
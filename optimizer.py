@@ -0,0 +1,187 @@
+import operator
+
+from LPI import *
+
+
+class NodeCounter(IterativeNodeVisitor):
+    def count(self, node, *counts):
+        return 1 + sum(counts)
+
+    leave_BinOp = leave_UnOp = leave_Num = leave_Var = leave_AssignOp = count
+    leave_Compound = leave_NoOp = leave_Program = leave_Block = count
+    leave_ProcedureDecl = leave_ProcedureCall = leave_VarDecl = leave_Type = count
+
+
+def count_nodes(tree):
+    return NodeCounter().visit(tree)
+
+
+class Optimizer(IterativeNodeVisitor):
+    """AST-to-AST pass run between Parser.parse() and execution.
+
+    - constant BinOp/UnOp subtrees are folded into Num
+    - chains of unary +/- collapse into at most one unary minus
+    - x*1, 1*x, x+0, 0+x, x-0 become x and x*0, 0*x become 0 when x is
+      INTEGER by its declarations; x*0 is only applied when x has no
+      division in it, but reading an unassigned variable in x no longer fails
+    - division by a constant zero is reported before the program runs
+
+    The input tree is never modified: unchanged subtrees are shared and
+    changed ones are rebuilt, so a tree can be optimized while it's in use.
+
+    The tree is walked on an explicit stack. An expression leaves
+    (node, is INTEGER, has division) for its parent, so both are known
+    from the children without walking the subtree again.
+    """
+
+    BINARY_OPERATORS = {
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '/': operator.truediv,
+        'DIV': operator.floordiv
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.scopes = [{}]
+        self.removed = 0
+
+    @staticmethod
+    def constant(value):
+        if isinstance(value, int):
+            return Num(Token(INTEGER_CONST, value)), True, False
+        return Num(Token(REAL_CONST, value)), False, False
+
+    @staticmethod
+    def signs(node):
+        """(operand under the chain of UnOps at node, whether it negates it, last op)"""
+
+        negative = False
+        while isinstance(node, UnOp):
+            if node.op.value == '-':
+                negative = not negative
+            op = node.op
+            node = node.expr
+        return node, negative, op
+
+    def leave_BinOp(self, node, left_result, right_result):
+        left, left_integer, left_division = left_result
+        right, right_integer, right_division = right_result
+        op = node.op.value
+
+        if op in ('/', 'DIV') and isinstance(right, Num) and right.value == 0:
+            error(DIVIDING_BY_ZERO[lang])
+
+        if isinstance(left, Num) and isinstance(right, Num):
+            return self.constant(self.BINARY_OPERATORS[op](left.value, right.value))
+
+        if isinstance(right, Num) and type(right.value) is int and left_integer:
+            if right.value == 0 and op in ('+', '-'):
+                return left_result
+            if right.value == 1 and op == '*':
+                return left_result
+            if right.value == 0 and op == '*' and not left_division:
+                return right_result
+        if isinstance(left, Num) and type(left.value) is int and right_integer:
+            if left.value == 0 and op == '+':
+                return right_result
+            if left.value == 1 and op == '*':
+                return right_result
+            if left.value == 0 and op == '*' and not right_division:
+                return left_result
+
+        if left is not node.left or right is not node.right:
+            node = BinOp(left, node.op, right)
+        return (node, op != '/' and left_integer and right_integer,
+                op in ('/', 'DIV') or left_division or right_division)
+
+    def children_UnOp(self, node):
+        expr, _, _ = self.signs(node)
+        return expr,
+
+    def leave_UnOp(self, node, result):
+        expr, integer, division = result
+        _, negative, op = self.signs(node)
+
+        if isinstance(expr, Num):
+            return self.constant(-expr.value) if negative else result
+        if not negative:
+            return result
+        if op.value != '-':
+            op = Token(OPERATOR, '-')
+        return UnOp(op, expr), integer, division
+
+    def leave_Num(self, node):
+        return node, isinstance(node.value, int), False
+
+    def leave_Var(self, node):
+        for scope in reversed(self.scopes):
+            if node.value in scope:
+                return node, scope[node.value] == INTEGER, False
+        return node, False, False
+
+    def leave_Compound(self, node, *children):
+        if all(new is old for new, old in zip(children, node.children)):
+            return node
+        root = Compound()
+        root.children = list(children)
+        return root
+
+    def children_AssignOp(self, node):
+        return node.right,
+
+    def leave_AssignOp(self, node, result):
+        right = result[0]
+        if right is node.right:
+            return node
+        return AssignOp(node.left, node.op, right)
+
+    def leave_NoOp(self, node):
+        return node
+
+    def leave_Program(self, node, block):
+        if block is node.block:
+            return node
+        return Program(node.name, block)
+
+    def enter_Block(self, node):
+        self.scopes.append({})
+
+    def leave_Block(self, node, *children):
+        self.scopes.pop()
+        *declarations, compound_statement = children
+        if (compound_statement is node.compound_statement
+                and all(new is old for new, old in zip(declarations, node.declarations))):
+            return node
+        return Block(declarations, compound_statement)
+
+    def leave_ProcedureDecl(self, node, block):
+        if block is node.block:
+            return node
+        return ProcedureDecl(node.name, block)
+
+    def leave_ProcedureCall(self, node):
+        # A copy, since resolving the optimized tree points it to a new symbol
+        return ProcedureCall(node.name)
+
+    def children_VarDecl(self, node):
+        return ()
+
+    def leave_VarDecl(self, node):
+        self.scopes[-1][node.var_node.value] = node.type_node.value
+        return node
+
+    def optimize(self, tree):
+        before = count_nodes(tree)
+        tree = self.visit(tree)
+        self.removed += before - count_nodes(tree)
+        return tree
+
+
+def optimize(tree):
+    """Returns (optimized tree, number of nodes removed)"""
+
+    optimizer = Optimizer()
+    tree = optimizer.optimize(tree)
+    return tree, optimizer.removed
@@ -0,0 +1,126 @@
+from collections import deque
+import time
+
+from LPI import *
+
+PENDING = 'PENDING'
+DONE = 'DONE'
+FAILED = 'FAILED'
+CANCELLED = 'CANCELLED'
+
+
+class Task(object):
+    """A program run by a Scheduler, a few steps at a time.
+
+    A step is one node entered or left by the SlotInterpreter. Every turn
+    the task runs quota steps. It fails when it needs more than max_steps
+    steps in total, counted in whole turns, or is still running at
+    deadline, a time.monotonic() value; both are checked between turns.
+    """
+
+    def __init__(self, name, program, quota, max_steps=None, deadline=None):
+        self.name = name
+        self.interpreter = ExecutionState(program)
+        self.generator = self.interpreter.steps(program.tree, quota)
+        self.quota = quota
+        self.max_steps = max_steps
+        self.deadline = deadline
+        self.state = PENDING
+        self.steps = 0
+        self.turns = 0
+        self.global_scope = None
+        self.error = None
+        self.submitted = time.monotonic()
+        self.finished = None
+
+    @property
+    def latency(self):
+        """Seconds from submission to the end, None while pending"""
+
+        return None if self.finished is None else self.finished - self.submitted
+
+    def cancel(self):
+        """Stops the task, unless it is already over"""
+
+        if self.state == PENDING:
+            self.finish(CANCELLED, error=TASK_CANCELLED[lang])
+
+    def finish(self, state, global_scope=None, error=None):
+        self.generator.close()
+        self.state = state
+        self.global_scope = global_scope
+        self.error = error
+        self.finished = time.monotonic()
+
+    def turn(self):
+        """Runs the task for one quota of steps, returns whether it is still pending"""
+
+        if self.state != PENDING:
+            return False
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.finish(FAILED, error=DEADLINE_EXCEEDED[lang])
+            return False
+        if self.max_steps is not None and self.steps >= self.max_steps:
+            self.finish(FAILED, error=STEP_BUDGET_EXCEEDED[lang])
+            return False
+        self.turns += 1
+        try:
+            next(self.generator)
+        except StopIteration:
+            self.finish(DONE, self.interpreter.GLOBAL_SCOPE)
+            return False
+        except Exception as e:
+            self.finish(FAILED, error=f'{type(e).__name__}: {e}')
+            return False
+        self.steps += self.quota
+        return True
+
+    def __str__(self):
+        return f'{self.name}: {self.state} {self.error or self.global_scope or ""}'.rstrip()
+
+    __repr__ = __str__
+
+
+class Scheduler(object):
+    """Runs many programs interleaved in one thread, round robin.
+
+    Each turn goes to the next pending task for its quota of steps, so a
+    small program submitted behind a huge one finishes after a few turns
+    of the huge one instead of after all of it. Parsing and analysis
+    happen in submit() and are not interleaved; a CompiledProgram can be
+    submitted any number of times without them.
+    """
+
+    def __init__(self, quota=1000):
+        self.quota = quota
+        self.tasks = deque()
+        self.submitted = 0
+
+    def submit(self, program, name=None, quota=None, max_steps=None, timeout=None):
+        """Task running program, a CompiledProgram or its text; timeout is in seconds from now"""
+
+        self.submitted += 1
+        name = name if name is not None else f'task{self.submitted}'
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not isinstance(program, CompiledProgram):
+            program = CompiledProgram.from_source(program)
+        task = Task(name, program, quota or self.quota, max_steps, deadline)
+        self.tasks.append(task)
+        return task
+
+    def step(self):
+        """Gives one turn to the next pending task, returns False once there are none"""
+
+        tasks = self.tasks
+        while tasks:
+            task = tasks.popleft()
+            if task.state != PENDING:
+                continue
+            if task.turn():
+                tasks.append(task)
+            return True
+        return False
+
+    def run(self):
+        while self.step():
+            pass
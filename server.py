@@ -0,0 +1,153 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import sys
+
+from session import Session, COMMANDS
+
+# Read in place of a request line longer than Server.max_line
+TOO_LONG = object()
+
+
+class Server(object):
+    """Serves many Sessions from one process over TCP or a Unix socket.
+
+    Protocol: every request is a line of UTF-8 text, an input or a command
+    as in the session REPL, and gets exactly one response line, a JSON
+    object, in the order the requests came:
+        {"ok": true, "scope": {...}}     - GLOBAL_SCOPE after the input ran
+        {"ok": true, "output": "..."}    - result of a :command
+        {"ok": false, "error": "..."}    - the input was rejected or failed
+    A line longer than max_line is skipped up to its line break and gets
+    an error response; empty lines get none.
+    Every connection gets its own Session, so its symbol table and scope
+    live as long as the connection.
+
+    Requests of a connection wait in a queue of queue_size; when it is
+    full the server stops reading from that connection, and the client
+    blocks on its socket. Inputs are run on a pool of worker threads, one
+    at a time per session, so the event loop goes on accepting and
+    answering other connections while a long program runs.
+    """
+
+    def __init__(self, workers=4, queue_size=16, max_line=1 << 20):
+        self.executor = ThreadPoolExecutor(workers)
+        self.queue_size = queue_size
+        self.max_line = max_line
+        self.sessions = 0
+
+    @staticmethod
+    def evaluate(session, line):
+        """Response to one request line, runs in a worker thread"""
+
+        try:
+            if line.startswith(':'):
+                command = COMMANDS.get(line.split()[0])
+                if command is None:
+                    return {'ok': False, 'error': f'Commands: {", ".join(COMMANDS)}'}
+                return {'ok': True, 'output': command(session)}
+            return {'ok': True, 'scope': session.execute(line)}
+        except Exception as e:
+            return {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+
+    async def respond(self, session, queue, writer):
+        loop = asyncio.get_running_loop()
+        while (line := await queue.get()) is not None:
+            if line is TOO_LONG:
+                response = {'ok': False, 'error': 'Request line too long'}
+            else:
+                response = await loop.run_in_executor(self.executor, self.evaluate, session, line)
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+
+    @staticmethod
+    async def read_request(reader):
+        """Next request line, TOO_LONG for a line over the limit, None at the end"""
+
+        too_long = False
+        while True:
+            try:
+                line = await reader.readuntil(b'\n')
+            except asyncio.IncompleteReadError as e:
+                # The last line may have no line break
+                line = e.partial
+                if not line and not too_long:
+                    return None
+            except asyncio.LimitOverrunError as e:
+                # Skips what was read of the line, up to its line break if it came
+                await reader.readexactly(e.consumed)
+                too_long = True
+                continue
+            return TOO_LONG if too_long else line
+
+    @staticmethod
+    async def put(queue, item, responder):
+        """Puts item in queue, returns False instead if responder ends first"""
+
+        if not queue.full():
+            queue.put_nowait(item)
+            return True
+        put = asyncio.ensure_future(queue.put(item))
+        await asyncio.wait((put, responder), return_when=asyncio.FIRST_COMPLETED)
+        if put.done():
+            return True
+        # The responder failed, e.g. on a reset connection, and the queue stays full
+        put.cancel()
+        return False
+
+    async def handle(self, reader, writer):
+        self.sessions += 1
+        queue = asyncio.Queue(self.queue_size)
+        responder = asyncio.create_task(self.respond(Session(), queue, writer))
+        try:
+            while (line := await self.read_request(reader)) is not None:
+                if line is not TOO_LONG:
+                    line = line.decode(errors='replace').strip()
+                    if not line:
+                        continue
+                if not await self.put(queue, line, responder):
+                    break
+            # Requests already read are still answered
+            await self.put(queue, None, responder)
+            await responder
+        except ConnectionError:
+            pass
+        finally:
+            responder.cancel()
+            self.sessions -= 1
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """Listens on the Unix socket at path if given, else on host:port"""
+
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path, limit=self.max_line)
+        return await asyncio.start_server(self.handle, host, port, limit=self.max_line)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def serve(server, host, port, path):
+    listener = await server.start(host, port, path)
+    names = ', '.join(str(socket.getsockname()) for socket in listener.sockets)
+    print(f'Serving on {names}', file=sys.stderr)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(args):
+    """server [--host=HOST] [--port=N] [--unix=PATH] [--workers=N] [--queue-size=N]"""
+
+    options = {'host': '127.0.0.1', 'port': 8765, 'unix': None, 'workers': 4, 'queue-size': 16}
+    for arg in args:
+        key, _, value = arg.lstrip('-').partition('=')
+        options[key] = value if key in ('host', 'unix') else int(value)
+
+    server = Server(options['workers'], options['queue-size'])
+    try:
+        asyncio.run(serve(server, options['host'], options['port'], options['unix']))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,136 @@
+import time
+
+from LPI import *
+from typechecker import TypeChecker
+
+
+class Session(object):
+    """A program entered piece by piece, with everything entered so far kept.
+
+    Every input holds either declarations (VAR ...; PROCEDURE ...;) or
+    statements separated by ';', as they would appear in a block. Only the new
+    input is parsed, resolved against the session's global SymbolTable,
+    type checked and run by the session's SlotInterpreter, so variables
+    keep their values and procedures stay declared between inputs.
+
+    Declarations are all or nothing: if resolving an input fails, the
+    symbols it defined are removed again. Statements that already ran
+    before a run time error keep their effect.
+    """
+
+    PHASES = ('parse', 'analyze', 'run')
+
+    def __init__(self, max_call_depth=100):
+        self.builder = SymbolTableBuilder()
+        self.symbol_table = self.builder.symbol_table
+        self.interpreter = SlotInterpreter(self.symbol_table, max_call_depth)
+        self.type_checker = TypeChecker()
+        # Seconds spent in each phase by the last input and by all of them
+        self.last_timing = dict.fromkeys(self.PHASES, 0.0)
+        self.total_timing = dict.fromkeys(self.PHASES, 0.0)
+        self.inputs = 0
+
+    @property
+    def GLOBAL_SCOPE(self):
+        return self.interpreter.GLOBAL_SCOPE
+
+    def parse(self, text):
+        """(declarations, Compound of the statements or None)"""
+
+        parser = Parser(Lexer(text))
+        compound = None
+        if parser.current_token.type in (VAR, PROCEDURE):
+            declarations = parser.declarations()
+        else:
+            declarations = []
+            compound = Compound()
+            compound.children = parser.statements_list()
+        if parser.current_token.type != EOF:
+            error(INVALID_SYNTAX[lang])
+        return declarations, compound
+
+    def analyze(self, declarations, compound):
+        symbols = self.symbol_table._symbols.copy()
+        slots = len(self.symbol_table.slots)
+        # A failing procedure body leaves the builder in the procedure's scope
+        scope = self.builder.current_scope
+        try:
+            for node in declarations:
+                self.builder.visit(node)
+                self.type_checker.visit(node)
+            if compound is not None:
+                self.builder.visit(compound)
+                self.type_checker.visit(compound)
+        except Exception:
+            self.builder.current_scope = scope
+            self.symbol_table._symbols = symbols
+            del self.symbol_table.slots[slots:]
+            raise
+
+        # Room in the global record for the variables just declared
+        for symbol in self.symbol_table.slots[len(self.interpreter.names):]:
+            self.interpreter.names.append(symbol.name)
+            self.interpreter.global_record.slots.append(UNASSIGNED)
+
+    def timed(self, phase, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.last_timing[phase] = elapsed
+            self.total_timing[phase] += elapsed
+
+    def execute(self, text):
+        """Parses, resolves and runs one input, returns GLOBAL_SCOPE"""
+
+        self.last_timing = dict.fromkeys(self.PHASES, 0.0)
+        self.inputs += 1
+        declarations, compound = self.timed('parse', self.parse, text)
+        self.timed('analyze', self.analyze, declarations, compound)
+        if compound is not None:
+            self.timed('run', self.interpreter.visit, compound)
+        return self.GLOBAL_SCOPE
+
+    def dump_scope(self):
+        lines = ['GLOBAL_SCOPE: ']
+        for symbol in self.symbol_table.slots:
+            value = self.interpreter.global_record.slots[symbol.slot]
+            lines.append(f'{symbol.name} : {symbol.type.name} = {value}')
+        return '\n'.join(lines)
+
+    def dump_timing(self):
+        lines = [f'{"":<8}{"last":>12}{"total":>12}']
+        for phase in self.PHASES:
+            lines.append(f'{phase:<8}{self.last_timing[phase] * 1000:>10.3f}ms'
+                         f'{self.total_timing[phase] * 1000:>10.3f}ms')
+        lines.append(f'{self.inputs} inputs')
+        return '\n'.join(lines)
+
+
+COMMANDS = {
+    ':scope': Session.dump_scope,
+    ':symbols': lambda session: str(session.symbol_table),
+    ':time': Session.dump_timing,
+}
+
+
+def main():
+    show_symbol_log()
+    session = Session()
+    while True:
+        try:
+            text = input('session>')
+        except EOFError:
+            break
+        text = text.strip()
+        if not text:
+            continue
+        if text.startswith(':'):
+            command = COMMANDS.get(text.split()[0])
+            print(command(session) if command else f'Commands: {", ".join(COMMANDS)}')
+            continue
+        try:
+            session.execute(text)
+        except Exception as e:
+            print(f'{type(e).__name__}: {e}')
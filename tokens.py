@@ -18,3 +18,11 @@ REAL = 'REAL'
 COLON = 'COLON'
 COMMA = 'COMMA'
 PROCEDURE = 'PROCEDURE'
+
+# Order defines the small-int codes used by TokenBuffer
+TOKEN_TYPES = (
+    EOF, INTEGER_CONST, REAL_CONST, OPERATOR, BRACKET_LEFT, BRACKET_RIGHT,
+    BEGIN, END, SEMI, ID, DOT, ASSIGN, PROGRAM, VAR, INTEGER, REAL, COLON,
+    COMMA, PROCEDURE
+)
+TOKEN_CODES = {_type: code for code, _type in enumerate(TOKEN_TYPES)}
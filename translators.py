@@ -1,63 +1,298 @@
-from LPI import Lexer, Parser, NodeVisitor
+import io
+import keyword
+import sys
 
+from cache import PARSE_CACHE
+from LPI import Lexer, Parser, PrattParser, IterativeNodeVisitor, analyze_tree, error, lang
+from errors import INVALID_SYNTAX, UNSUPPORTED_PROCEDURE_CALL
+from tokens import EOF
 
-##################
-# RPN Translator #
-##################
 
+##########################
+# Expression translators #
+##########################
 
-class RPNTranslator(NodeVisitor):
-    def __init__(self, parser):
+
+class ExpressionTranslator(IterativeNodeVisitor):
+    """Writes the translation of an expression tree piece by piece.
+
+    Subclasses write through emit() from their enter_/leave_ hooks instead
+    of returning strings, so nothing is concatenated while walking the tree
+    and the output size doesn't affect the cost of each write.
+    """
+
+    NAME = None
+
+    def __init__(self, parser=None):
+        super().__init__()
         self.parser = parser
+        self.writer = None
+        self.separator = ''
+
+    def emit(self, text):
+        self.writer.write(self.separator)
+        self.writer.write(text)
+        self.separator = ' '
+
+    def write(self, tree, writer):
+        self.writer = writer
+        self.separator = ''
+        try:
+            self.visit(tree)
+        finally:
+            self.writer = None
+
+    def translate(self, tree=None):
+        if tree is None:
+            tree = expression(self.parser)
+        writer = io.StringIO()
+        self.write(tree, writer)
+        return writer.getvalue()
+
+
+def expression(parser):
+    """Parses a whole input as a single expression"""
+
+    tree = parser.expr()
+    if parser.current_token.type != EOF:
+        error(INVALID_SYNTAX[lang])
+    return tree
+
+
+def parse_expression(text):
+    return expression(PrattParser(Lexer(text)))
 
-    def visit_BinOp(self, node):
-        right_value = self.visit(node.right)
-        left_value = self.visit(node.left)
 
-        return f'{left_value} {right_value} {node.op.value}'
+##################
+# RPN Translator #
+##################
+
+
+class RPNTranslator(ExpressionTranslator):
+    NAME = 'RPN'
 
-    def visit_Num(self, node):
-        return node.value
+    def leave_BinOp(self, node, left_value, right_value):
+        self.emit(node.op.value)
 
-    def translate(self):
-        tree = self.parser.parse()
-        return self.visit(tree)
+    def leave_Num(self, node):
+        self.emit(str(node.value))
 
 
 def translate_to_RPN(text):
-    lexer = Lexer(text)
-    parser = Parser(lexer)
-    rpn = RPNTranslator(parser)
-    return rpn.translate()
+    return RPNTranslator().translate(PARSE_CACHE.get('expression', text, parse_expression))
 
 ###################
 # LISP Translator #
 ###################
 
 
-class LISPTranslator(NodeVisitor):
+class LISPTranslator(ExpressionTranslator):
+    NAME = 'LISP'
+
+    def enter_BinOp(self, node):
+        self.emit('(' + node.op.value)
+
+    def leave_BinOp(self, node, left_value, right_value):
+        self.writer.write(')')
+
+    def leave_Num(self, node):
+        self.emit(str(node.value))
+
+
+def translate_to_LISP(text):
+    return LISPTranslator().translate(PARSE_CACHE.get('expression', text, parse_expression))
+
+
+############
+# Pipeline #
+############
+
+
+def translate_all(text, translators=(RPNTranslator, LISPTranslator), writer=None,
+                  labels=True):
+    """Parses text once and writes its translation by each translator to writer.
+
+    translators are ExpressionTranslator classes or instances. Every
+    translation goes on its own line, prefixed with the translator's NAME
+    when labels is set. writer defaults to sys.stdout; pass io.StringIO or
+    an open file to collect the output elsewhere.
+    """
+
+    tree = PARSE_CACHE.get('expression', text, parse_expression)
+    if writer is None:
+        writer = sys.stdout
+    for translator in translators:
+        if isinstance(translator, type):
+            translator = translator()
+        if labels:
+            writer.write(translator.NAME + ': ')
+        translator.write(tree, writer)
+        writer.write('\n')
+    return writer
+
+
+#####################
+# Python Translator #
+#####################
+
+
+class PythonTranslator(IterativeNodeVisitor):
+    """Translates a whole Program into Python source.
+
+    Variables become plain names executed against a scope dict. Names that
+    would clash with Python keywords or with the names the translation
+    uses itself get a trailing underscore (and so does any name that
+    already looks like a mangled one, e.g. if_ -> if__).
+
+    Expressions get parentheses only where Python's precedence and left
+    associativity need them. CPython's compiler recurses on nesting, so a
+    subexpression MAX_DEPTH deep is computed into a temporary, an item of
+    the TEMPORARY list, by a line of its own; everything evaluated before
+    it in the statement is computed first too, so errors happen in the
+    same order as in the other engines.
+    """
+
+    OPERATORS = {'+': '+', '-': '-', '*': '*', '/': '/', 'DIV': '//'}
+    PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, 'DIV': 2}
+    UNARY = 3
+    ATOM = 4
+    MAX_DEPTH = 100
+    TEMPORARY = 'tmp'
+    BUILTINS = {'float': float}
+    RESERVED = frozenset(keyword.kwlist).union(BUILTINS, [TEMPORARY])
+
     def __init__(self, parser):
+        super().__init__()
         self.parser = parser
+        self.source = None
+        self.code = None
+        self.lines = []
+        # [text, precedence, depth] of the expressions not used yet, in order
+        self.pending = []
+        self.temporaries = 0
 
-    def visit_BinOp(self, node):
-        left_value = self.visit(node.left)
-        right_value = self.visit(node.right)
+    @classmethod
+    def identifier(cls, name):
+        if name.rstrip('_') in cls.RESERVED:
+            return name + '_'
+        return name
 
-        return f'({node.op.value} {left_value} {right_value})'
+    @classmethod
+    def variable_name(cls, identifier):
+        if identifier.rstrip('_') in cls.RESERVED:
+            return identifier[:-1]
+        return identifier
 
-    def visit_Num(self, node):
-        return node.value
+    def hoist(self, expression):
+        """Computes expression into a temporary and puts the temporary in its place"""
 
-    def translate(self):
-        tree = self.parser.parse()
-        return self.visit(tree)
+        name = f'{self.TEMPORARY}[{self.temporaries}]'
+        self.temporaries += 1
+        self.lines.append(f'{name} = {expression[0]}')
+        expression[:] = name, self.ATOM, 0
 
+    def expression(self, text, precedence, depth):
+        expression = [text, precedence, depth]
+        if depth >= self.MAX_DEPTH:
+            for pending in self.pending:
+                if pending[2]:
+                    self.hoist(pending)
+            self.hoist(expression)
+        self.pending.append(expression)
+        return expression
 
-def translate_to_LISP(text):
-    lexer = Lexer(text)
-    parser = Parser(lexer)
-    lisp = LISPTranslator(parser)
-    return lisp.translate()
+    def leave_BinOp(self, node, left, right):
+        del self.pending[-2:]
+        precedence = self.PRECEDENCE[node.op.value]
+        left_text = left[0] if left[1] >= precedence else f'({left[0]})'
+        right_text = right[0] if right[1] > precedence else f'({right[0]})'
+        return self.expression(f'{left_text} {self.OPERATORS[node.op.value]} {right_text}',
+                               precedence, 1 + max(left[2], right[2]))
+
+    def leave_Num(self, node):
+        value = node.value
+        return self.expression(repr(value), self.ATOM if value >= 0 else self.UNARY, 0)
+
+    def leave_UnOp(self, node, expr):
+        self.pending.pop()
+        text = expr[0] if expr[1] >= self.UNARY else f'({expr[0]})'
+        return self.expression(node.op.value + text, self.UNARY, 1 + expr[2])
+
+    def leave_Var(self, node):
+        return self.expression(self.identifier(node.value), self.ATOM, 1)
+
+    def children_AssignOp(self, node):
+        return node.right,
+
+    def leave_AssignOp(self, node, value):
+        self.pending.pop()
+        text = value[0]
+        if getattr(node, 'promote', False):
+            text = f'float({text})'
+        self.lines.append(f'{self.identifier(node.left.value)} = {text}')
+
+    def leave_Compound(self, node, *results):
+        return None
+
+    def leave_Program(self, node, block):
+        if self.temporaries:
+            self.lines.insert(0, f'{self.TEMPORARY} = [None] * {self.temporaries}')
+        return f'# PROGRAM {node.name}\n' + '\n'.join(self.lines) + '\n'
+
+    def children_Block(self, node):
+        return node.compound_statement,
+
+    def leave_Block(self, node, compound_statement):
+        return None
+
+    def leave_NoOp(self, node):
+        return None
+
+    def leave_ProcedureCall(self, node):
+        error(UNSUPPORTED_PROCEDURE_CALL[lang])
+
+    def translate(self, tree=None):
+        if self.source is None:
+            if tree is None:
+                tree = self.parser.parse()
+            self.source = self.visit(tree)
+        return self.source
+
+    def compile(self):
+        if self.code is None:
+            self.code = compile(self.translate(), '<PythonTranslator>', 'exec')
+        return self.code
+
+    def execute(self, scope=None):
+        """Runs the compiled program and returns its GLOBAL_SCOPE"""
+
+        local_scope = {self.identifier(name): value for name, value in (scope or {}).items()}
+        exec(self.compile(), {'__builtins__': self.BUILTINS}, local_scope)
+        return {self.variable_name(name): value for name, value in local_scope.items()
+                if name != self.TEMPORARY}
+
+
+def translate_to_Python(text):
+    return python_translator(text).translate()
+
+
+def compile_python(text):
+    # Type checking marks the assignments that promote INTEGER to REAL
+    tree, _ = analyze_tree(Parser(Lexer(text)).parse())
+    translator = PythonTranslator(None)
+    translator.translate(tree)
+    translator.compile()
+    return translator
+
+
+def python_translator(text):
+    """Compiled PythonTranslator for text, cached by source in PARSE_CACHE"""
+
+    return PARSE_CACHE.get('python', text, compile_python)
+
+
+def run_Python(text, scope=None):
+    return python_translator(text).execute(scope)
 
 
 def main():
@@ -69,5 +304,4 @@ def main():
         if not text:
             continue
 
-        print('RPN: ' + translate_to_RPN(text))
-        print('LISP: ' + translate_to_LISP(text))
+        translate_all(text)
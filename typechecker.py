@@ -0,0 +1,78 @@
+from LPI import *
+
+
+class TypeChecker(IterativeNodeVisitor):
+    """Labels every expression node with its type, INTEGER or REAL.
+
+    Runs after SymbolTableBuilder, which gives every Var its declared type.
+    DIV with a REAL operand and assignment of a REAL expression to an
+    INTEGER variable are reported before the program runs. An AssignOp
+    that stores an INTEGER expression into a REAL variable gets
+    promote = True so engines can convert the value once at that point.
+
+    It runs on an explicit stack like the interpreters, so it accepts
+    every tree the parser builds however deep it is.
+    """
+
+    def leave_BinOp(self, node, left, right):
+        op = node.op.value
+
+        if op == 'DIV':
+            if left != INTEGER or right != INTEGER:
+                error(INVALID_DIV_OPERANDS[lang])
+            node.type = INTEGER
+        elif op == '/':
+            node.type = REAL
+        elif left == INTEGER and right == INTEGER:
+            node.type = INTEGER
+        else:
+            node.type = REAL
+        return node.type
+
+    def leave_Num(self, node):
+        node.type = INTEGER if isinstance(node.value, int) else REAL
+        return node.type
+
+    def leave_UnOp(self, node, expr):
+        node.type = expr
+        return node.type
+
+    def leave_Var(self, node):
+        return node.type
+
+    def leave_Compound(self, node, *results):
+        return None
+
+    def leave_AssignOp(self, node, left, right):
+        if left == INTEGER and right == REAL:
+            error(INCOMPATIBLE_ASSIGNMENT[lang])
+        node.promote = left == REAL and right == INTEGER
+
+    def leave_Program(self, node, block):
+        return None
+
+    def leave_Block(self, node, *results):
+        return None
+
+    def leave_ProcedureDecl(self, node, block):
+        return None
+
+    def leave_ProcedureCall(self, node):
+        return None
+
+    def children_VarDecl(self, node):
+        return ()
+
+    def leave_VarDecl(self, node):
+        return None
+
+    def leave_Type(self, node):
+        return None
+
+    def leave_NoOp(self, node):
+        return None
+
+
+def check_types(tree):
+    TypeChecker().visit(tree)
+    return tree
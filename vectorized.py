@@ -0,0 +1,75 @@
+from LPI import *
+from typechecker import check_types
+
+# NumPy is optional, only this module needs it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DTYPES = {INTEGER: 'int64', REAL: 'float64'}
+
+
+class VectorInterpreter(Interpreter):
+    """Interpreter running a program for many starting values at once.
+
+    Every variable holds a NumPy array with one element per run, so
+    BinOp, UnOp and AssignOp work on whole columns and a single walk of
+    the tree does the work of one Interpreter walk per row. DIV is floor
+    division and / true division, as in the scalar engines.
+
+    A division by zero doesn't stop the walk: the rows it happened in are
+    set in self.failed, and their values from then on are meaningless.
+    INTEGER values are int64, so unlike Python ints they can overflow.
+    """
+
+    def __init__(self, bindings, size=None):
+        super().__init__(None)
+        if numpy is None:
+            error(NUMPY_REQUIRED[lang])
+        self.GLOBAL_SCOPE = {name: numpy.asarray(value) for name, value in bindings.items()}
+        shapes = [value.shape for value in self.GLOBAL_SCOPE.values()]
+        if size is not None:
+            shapes.append((size,))
+        self.shape = numpy.broadcast_shapes(*shapes)
+        self.failed = numpy.zeros(self.shape, dtype=bool)
+
+    def leave_BinOp(self, node, left, right):
+        op = node.op.value
+        if op == '/' or op == 'DIV':
+            zero = numpy.equal(right, 0)
+            if zero.any():
+                self.failed |= zero
+                right = numpy.where(zero, 1, right)
+        return super().leave_BinOp(node, left, right)
+
+    def leave_AssignOp(self, node, value):
+        value = numpy.asarray(value)
+        if getattr(node, 'promote', False):
+            value = value.astype(DTYPES[REAL])
+        if value.shape != self.shape:
+            # Constant expressions give one value for every row
+            value = numpy.broadcast_to(value, self.shape).copy()
+        self.GLOBAL_SCOPE[node.left.value] = value
+
+
+def run_vectorized(tree, bindings, size=None, symbol_table=None):
+    """Runs tree with each variable in bindings set to an array of starting values.
+
+    Bindings are converted to the declared type of their variable. Returns
+    (GLOBAL_SCOPE of arrays, boolean array of the rows that divided by zero).
+    """
+
+    if numpy is None:
+        error(NUMPY_REQUIRED[lang])
+    if symbol_table is None:
+        symtab = SymbolTableBuilder()
+        symtab.visit(tree)
+        symbol_table = symtab.symbol_table
+        check_types(tree)
+    types = {symbol.name: symbol.type.name for symbol in symbol_table.slots}
+    interpreter = VectorInterpreter(
+        {name: numpy.asarray(value, dtype=DTYPES.get(types.get(name)))
+         for name, value in bindings.items()}, size)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE, interpreter.failed
@@ -0,0 +1,210 @@
+from errors import *
+from array import array
+import hashlib
+import marshal
+import struct
+import sys
+
+# Language
+lang = 'en'
+
+###########
+# Opcodes #
+###########
+
+# Code.instructions is a list of (opcode, argument) pairs.
+# Instructions without an argument carry 0.
+LOAD_CONST = 0
+LOAD_VAR = 1
+STORE_VAR = 2
+ADD = 3
+SUB = 4
+MUL = 5
+DIV = 6
+INT_DIV = 7
+NEG = 8
+HALT = 9
+# Binary operations whose right operand is the constant given as argument
+ADD_CONST = 10
+SUB_CONST = 11
+MUL_CONST = 12
+DIV_CONST = 13
+INT_DIV_CONST = 14
+TO_REAL = 15
+
+OPCODE_NAMES = ('LOAD_CONST', 'LOAD_VAR', 'STORE_VAR', 'ADD', 'SUB', 'MUL', 'DIV',
+                'INT_DIV', 'NEG', 'HALT', 'ADD_CONST', 'SUB_CONST', 'MUL_CONST',
+                'DIV_CONST', 'INT_DIV_CONST', 'TO_REAL')
+CONST_OPCODES = (LOAD_CONST, ADD_CONST, SUB_CONST, MUL_CONST, DIV_CONST, INT_DIV_CONST)
+
+
+class Code(object):
+    def __init__(self, instructions, constants, names, symbols=(), source_hash=None):
+        self.instructions = instructions
+        self.constants = constants
+        self.names = names
+        # (name, type) of the global variables, in slot order
+        self.symbols = symbols
+        # SHA-256 of the source it was compiled from, if known
+        self.source_hash = source_hash
+
+    def __str__(self):
+        lines = []
+        for pc, (op, arg) in enumerate(self.instructions):
+            if op in CONST_OPCODES:
+                lines.append(f'{pc:>6} {OPCODE_NAMES[op]:<14}{arg} ({self.constants[arg]!r})')
+            elif op in (LOAD_VAR, STORE_VAR):
+                lines.append(f'{pc:>6} {OPCODE_NAMES[op]:<14}{arg} ({self.names[arg]})')
+            else:
+                lines.append(f'{pc:>6} {OPCODE_NAMES[op]}')
+        return '\n'.join(lines)
+
+    __repr__ = __str__
+
+
+###################
+# Virtual Machine #
+###################
+
+
+class Undefined(object):
+    def __repr__(self):
+        return 'UNDEFINED'
+
+
+UNDEFINED = Undefined()
+
+
+class VirtualMachine(object):
+    def __init__(self, code):
+        self.code = code
+        self.variables = [UNDEFINED] * len(code.names)
+
+    @property
+    def GLOBAL_SCOPE(self):
+        return {name: value for name, value in zip(self.code.names, self.variables)
+                if value is not UNDEFINED}
+
+    def run(self):
+        constants = self.code.constants
+        variables = self.variables
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        for op, arg in self.code.instructions:
+            if op == LOAD_CONST:
+                push(constants[arg])
+            elif op == LOAD_VAR:
+                value = variables[arg]
+                if value is UNDEFINED:
+                    raise NameError(repr(self.code.names[arg]))
+                push(value)
+            elif op == STORE_VAR:
+                variables[arg] = pop()
+            elif op == ADD:
+                right = pop()
+                stack[-1] += right
+            elif op == SUB:
+                right = pop()
+                stack[-1] -= right
+            elif op == MUL:
+                right = pop()
+                stack[-1] *= right
+            elif op == DIV:
+                right = pop()
+                stack[-1] /= right
+            elif op == INT_DIV:
+                right = pop()
+                stack[-1] //= right
+            elif op == ADD_CONST:
+                stack[-1] += constants[arg]
+            elif op == SUB_CONST:
+                stack[-1] -= constants[arg]
+            elif op == MUL_CONST:
+                stack[-1] *= constants[arg]
+            elif op == DIV_CONST:
+                stack[-1] /= constants[arg]
+            elif op == INT_DIV_CONST:
+                stack[-1] //= constants[arg]
+            elif op == NEG:
+                stack[-1] = -stack[-1]
+            elif op == TO_REAL:
+                stack[-1] = float(stack[-1])
+            elif op == HALT:
+                return self.GLOBAL_SCOPE
+            else:
+                error(UNKNOWN_OPCODE[lang])
+
+
+def error(e):
+    raise Exception(e)
+
+
+def run(code):
+    return VirtualMachine(code).run()
+
+
+########################
+# Precompiled programs #
+########################
+
+# A precompiled program is HEADER (magic, FORMAT_VERSION, SHA-256 of the
+# source) followed by (opcodes, arguments, constants, names, symbols) in
+# marshal format. Opcodes are one byte each and arguments are little-endian
+# uint32. Loading it needs nothing but this module.
+MAGIC = b'MYLC'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sH32s')
+
+
+def source_hash(text):
+    return hashlib.sha256(text.encode()).digest()
+
+
+def save(code, path):
+    opcodes = array('B', [op for op, _ in code.instructions])
+    arguments = array('I', [arg for _, arg in code.instructions])
+    if sys.byteorder == 'big':
+        arguments.byteswap()
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, code.source_hash or bytes(32)))
+        marshal.dump((opcodes.tobytes(), arguments.tobytes(), tuple(code.constants),
+                      tuple(code.names), tuple(code.symbols)), file)
+
+
+def load(path, source=None):
+    """Code saved at path; if source text is given, it must be what the code was built from"""
+
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < HEADER.size:
+        error(INVALID_PRECOMPILED[lang])
+    magic, version, digest = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        error(INVALID_PRECOMPILED[lang])
+    if version != FORMAT_VERSION:
+        error(PRECOMPILED_VERSION[lang])
+    if source is not None and digest != source_hash(source):
+        error(STALE_PRECOMPILED[lang])
+    try:
+        opcodes, arguments, constants, names, symbols = marshal.loads(
+            memoryview(data)[HEADER.size:])
+        arguments = array('I', arguments)
+    except (EOFError, ValueError, TypeError):
+        error(INVALID_PRECOMPILED[lang])
+    if sys.byteorder == 'big':
+        arguments.byteswap()
+    instructions = list(zip(opcodes, arguments))
+    return Code(instructions, list(constants), list(names), symbols, digest)
+
+
+def run_file(path, source_path=None):
+    source = None
+    if source_path is not None:
+        with open(source_path) as file:
+            source = file.read()
+    global_scope = run(load(path, source))
+    print('GLOBAL_SCOPE: ')
+    for k, v in sorted(global_scope.items()):
+        print(f'{k} = {v}')